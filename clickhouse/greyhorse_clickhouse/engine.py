@@ -36,7 +36,7 @@ class CHAsyncEngine(AsyncEngine[AsyncChannel]):
             if 0 == self._counter:
                 assert not self._pool
 
-                loop = asyncio.get_event_loop()
+                loop = asyncio.get_running_loop()
                 self._pool = Pool(
                     dsn=self._config.dsn, echo=self._config.echo,
                     minsize=self._config.pool_min_size,
@@ -33,10 +33,7 @@ class ContextData(object):
     def session_id(self):
         if self._id:
             return self._id
-        try:
-            return id(asyncio.current_task())
-        except RuntimeError:
-            return threading.current_thread().ident
+        return _default_session_id()
 
     @session_id.setter
     def session_id(self, value):
@@ -46,6 +43,19 @@ class ContextData(object):
 _ctx: ContextVar[ContextData] = ContextVar('_ctx')
 
 
+def _default_session_id():
+    try:
+        return id(asyncio.current_task())
+    except RuntimeError:
+        return threading.current_thread().ident
+
+
+def get_session_id():
+    if (ctx := _ctx.get(None)) and ctx.raw_id:
+        return ctx.raw_id
+    return _default_session_id()
+
+
 def get_context():
     if ctx := _ctx.get(None):
         return ctx
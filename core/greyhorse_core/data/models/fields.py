@@ -1,8 +1,9 @@
 from collections import defaultdict
 from dataclasses import dataclass, field
+from operator import attrgetter
 from types import ClassMethodDescriptorType, FunctionType, GetSetDescriptorType, MappingProxyType, MemberDescriptorType, \
     MethodDescriptorType, MethodType, MethodWrapperType, WrapperDescriptorType
-from typing import Any, Dict, Mapping, Optional, Protocol, Sequence, Set
+from typing import Any, Callable, Dict, Mapping, Optional, Protocol, Sequence, Set, Tuple
 
 
 @dataclass
@@ -10,6 +11,17 @@ class FieldsCache:
     priv: Set[str] = field(default_factory=set)
     pub: Set[str] = field(default_factory=set)
     ser: Set[str] = field(default_factory=set)
+    pub_names: Tuple[str, ...] = ()
+    pub_getter: Callable[[Any], Tuple[Any, ...]] = lambda obj: ()
+
+
+def _tuple_getter(names: Tuple[str, ...]) -> Callable[[Any], Tuple[Any, ...]]:
+    if not names:
+        return lambda obj: ()
+    elif len(names) == 1:
+        getter = attrgetter(names[0])
+        return lambda obj: (getter(obj),)
+    return attrgetter(*names)
 
 
 class ModelFieldsMixin(Protocol):
@@ -26,7 +38,7 @@ class ModelFieldsMixin(Protocol):
 
     # noinspection PyProtectedMember
     @classmethod
-    def _calculate_fields(cls):
+    def _calculate_fields(cls) -> FieldsCache:
         private_types = (
             type, FunctionType, MethodType, MappingProxyType,
             WrapperDescriptorType, MethodWrapperType, MethodDescriptorType,
@@ -50,8 +62,19 @@ class ModelFieldsMixin(Protocol):
         public_fields.difference_update(cls.Meta.private_fields)
         serializable_fields.update(cls.Meta.serializable_fields)
         serializable_fields.difference_update(cls.Meta.non_serializable_fields)
-        cls.Meta._fields_cache[cls._fields_cache_key()] = \
-            FieldsCache(priv=private_fields, pub=public_fields, ser=serializable_fields)
+        public_names = tuple(public_fields)
+        cache = cls.Meta._fields_cache[cls._fields_cache_key()] = FieldsCache(
+            priv=private_fields, pub=public_fields, ser=serializable_fields,
+            pub_names=public_names, pub_getter=_tuple_getter(public_names),
+        )
+        return cache
+
+    # noinspection PyProtectedMember
+    @classmethod
+    def _get_fields_cache(cls) -> FieldsCache:
+        if cache := cls.Meta._fields_cache.get(cls._fields_cache_key()):
+            return cache
+        return cls._calculate_fields()
 
     # noinspection PyProtectedMember
     @classmethod
@@ -59,21 +82,13 @@ class ModelFieldsMixin(Protocol):
         key = cls._fields_cache_key()
         cls.Meta._fields_cache.pop(key, None)
 
-    # noinspection PyProtectedMember
     @classmethod
     def get_private_fields(cls) -> set[str]:
-        key = cls._fields_cache_key()
-        if key not in cls.Meta._fields_cache:
-            cls._calculate_fields()
-        return cls.Meta._fields_cache[key].priv
+        return cls._get_fields_cache().priv
 
-    # noinspection PyProtectedMember
     @classmethod
     def get_public_fields(cls) -> set[str]:
-        key = cls._fields_cache_key()
-        if key not in cls.Meta._fields_cache:
-            cls._calculate_fields()
-        return cls.Meta._fields_cache[key].pub
+        return cls._get_fields_cache().pub
 
     @classmethod
     def get_fields(cls) -> set[str]:
@@ -82,12 +97,19 @@ class ModelFieldsMixin(Protocol):
     def get_values(
         self, only_fields: Sequence[str] = None,
             exclude_fields: Sequence[str] = None) -> Mapping[str, Any]:
-        public_fields = self.get_public_fields()
-        only_fields = set(only_fields) if only_fields else set()
-        exclude_fields = set(exclude_fields) if exclude_fields else set()
-
-        return {
-            name: getattr(self, name) for name in public_fields
-            if hasattr(self, name) and (not only_fields or name in only_fields)
-            and (not exclude_fields or name not in exclude_fields)
-        }
+        if not only_fields and not exclude_fields:
+            # All public values are read with a single getter built for the class,
+            # the per field lookup below is only needed when one of them is missing
+            cache = self._get_fields_cache()
+            try:
+                return dict(zip(cache.pub_names, cache.pub_getter(self)))
+            except AttributeError:
+                pass
+
+        names = self.get_public_fields()
+        if only_fields:
+            names = names.intersection(only_fields)
+        if exclude_fields:
+            names = names.difference(exclude_fields)
+
+        return {name: getattr(self, name) for name in names if hasattr(self, name)}
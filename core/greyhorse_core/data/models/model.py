@@ -28,7 +28,7 @@ class Model(AbstractModel[IdType], ModelFieldsMixin, ABC):
 
     @classmethod
     async def construct_all(cls, objects: Sequence[Mapping[str, Any] | None], **kwargs) -> Sequence[Self | None]:
-        loop = asyncio.get_event_loop()
+        loop = asyncio.get_running_loop()
         awaitables = list()
 
         for data in objects:
@@ -18,13 +18,9 @@ class SerializableModel(Model, ABC):
 
         super().__init_subclass__(**kwargs)
 
-    # noinspection PyProtectedMember
     @classmethod
     def get_serializable_fields(cls) -> Set[str]:
-        key = cls._fields_cache_key()
-        if key not in cls.Meta._fields_cache:
-            cls._calculate_fields()
-        return cls.Meta._fields_cache[key].ser
+        return cls._get_fields_cache().ser
 
     def get_serializable_values(self, only_fields: Sequence[str] = None) -> Optional[Mapping[str, Any]]:
         serializable_fields = self.get_serializable_fields()
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from contextlib import AbstractAsyncContextManager, AbstractContextManager, asynccontextmanager, contextmanager
+from contextlib import AbstractAsyncContextManager, AbstractContextManager
 from typing import Callable, Generic, List, Mapping, Optional, TypeVar, Union
 
 SessionType = TypeVar('SessionType')
@@ -10,6 +10,7 @@ AsyncSessionFactory = Callable[[], AbstractAsyncContextManager[SessionType]]
 class SyncEngine(Generic[SessionType], ABC):
     is_sync = True
     is_async = False
+    __slots__ = ('_name',)
 
     def __init__(self, name: str):
         self._name = name
@@ -18,7 +19,6 @@ class SyncEngine(Generic[SessionType], ABC):
     def name(self) -> str:
         return self._name
 
-    @contextmanager
     @abstractmethod
     def session(self, *args, **kwargs) -> AbstractContextManager[SessionType]:
         ...
@@ -38,6 +38,7 @@ class SyncEngine(Generic[SessionType], ABC):
 class AsyncEngine(Generic[SessionType], ABC):
     is_sync = False
     is_async = True
+    __slots__ = ('_name',)
 
     def __init__(self, name: str):
         self._name = name
@@ -46,9 +47,8 @@ class AsyncEngine(Generic[SessionType], ABC):
     def name(self) -> str:
         return self._name
 
-    @asynccontextmanager
     @abstractmethod
-    async def session(self, *args, **kwargs) -> AbstractAsyncContextManager[SessionType]:
+    def session(self, *args, **kwargs) -> AbstractAsyncContextManager[SessionType]:
         ...
 
     async def teardown_session(self):
@@ -36,7 +36,7 @@ class RmqAsyncEngine(AsyncEngine[AsyncChannel]):
                 assert not self._conn_pool
                 assert not self._chan_pool
 
-                loop = asyncio.get_event_loop()
+                loop = asyncio.get_running_loop()
                 self._conn_pool = Pool(
                     self._get_connection, loop=loop,
                     max_size=self._config.pool_max_connections,
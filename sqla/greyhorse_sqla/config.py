@@ -14,6 +14,16 @@ class EngineConfig:
     pool_max_size: int = 8
     pool_expire_seconds: int = 60
     pool_timeout_seconds: int = 15
+    # Pinging checks a connection on every pool checkout, at the cost of an extra
+    # round-trip; stale connections are otherwise dropped after pool_expire_seconds
+    pool_pre_ping: bool = False
+    # Compiled forms of statements are reused across calls with the same structure,
+    # the cache is per engine and counts distinct statements
+    query_cache_size: int = 500
+    # Prepared statements cached per connection by the asyncpg dialect,
+    # so repeated queries skip parsing and planning on the server; zero disables it.
+    # Unset keeps the dialect default or the value given in the DSN query
+    prepared_statement_cache_size: int | None = None
 
 
 class SqlEngineType(str, enum.Enum):
@@ -1,60 +1,64 @@
+from dataclasses import fields
+from typing import Any, Mapping, get_args, get_type_hints
+
 from dependency_injector import containers, providers
 
-from greyhorse_core.utils.confs import default_value
 from greyhorse_sqla.config import EngineConfig, SqlEngineType
 from greyhorse_sqla.contexts import SqlaAsyncContext, SqlaSyncContext
-from greyhorse_sqla.factory import SqlaAsyncEngineFactory, SqlaSyncEngineFactory
+from greyhorse_sqla.factory import get_async_engine_factory, get_sync_engine_factory
 from greyhorse_sqla.resources import SqlaAsyncResource, SqlaSyncResource
 
 
+def _field_types(cls) -> dict[str, type]:
+    # Annotations are resolved from strings, optional ones are converted to the inner type
+    hints = get_type_hints(cls)
+    types = dict()
+    for f in fields(cls):
+        args = [arg for arg in get_args(hints[f.name]) if arg is not type(None)]
+        types[f.name] = args[0] if args else hints[f.name]
+    return types
+
+
+_ENGINE_CONFIG_TYPES = _field_types(EngineConfig)
+
+
+def _create_engine(
+    factory, name: str, config: EngineConfig, db_type: SqlEngineType, *args, **kwargs,
+):
+    return factory(name, config, db_type, *args, **kwargs)
+
+
+def _make_engine_config(data: Mapping[str, Any]) -> EngineConfig:
+    return EngineConfig(**{
+        name: type_(value) for name, value in data.items()
+        if (type_ := _ENGINE_CONFIG_TYPES.get(name)) and value is not None
+    })
+
+
 def _prepare_single_engine_config(config, factory):
-    if isinstance(config.engine_config(), EngineConfig):
-        engine_config = config.engine_config()
-    else:
-        engine_config = EngineConfig(
-            dsn=config.engine_config.dsn(),
-            echo=config.engine_config.echo.as_(bool)(),
-            pool_min_size=config.engine_config.
-                pool_min_size.as_(default_value(int))(default=1),
-            pool_max_size=config.engine_config.
-                pool_max_size.as_(default_value(int))(default=8),
-            pool_expire_seconds=config.engine_config.
-                pool_expire_seconds.as_(default_value(int))(default=60),
-            pool_timeout_seconds=config.engine_config.
-                pool_timeout_seconds.as_(default_value(int))(default=15),
-        )
+    engine_config = config.engine_config()
+    if not isinstance(engine_config, EngineConfig):
+        engine_config = _make_engine_config(engine_config)
     return factory(name=config.name(), config=engine_config, db_type=config.db_type())
 
 
 def _prepare_multiple_engine_config(name: str, config, factory):
     if conf := config.get(name):
-        if isinstance(conf['engine_config'], EngineConfig):
-            engine_config = conf['engine_config']
-        else:
-            engine_config = EngineConfig(
-                dsn=conf['engine_config']['dsn'],
-                echo=bool(conf['engine_config'].get('echo')),
-                pool_min_size=int(conf['engine_config'].get('pool_min_size', 1)),
-                pool_max_size=int(conf['engine_config'].get('pool_max_size', 8)),
-                pool_expire_seconds=int(conf['engine_config'].get('pool_expire_seconds', 60)),
-                pool_timeout_seconds=int(conf['engine_config'].get('pool_timeout_seconds', 15)),
-            )
+        engine_config = conf['engine_config']
+        if not isinstance(engine_config, EngineConfig):
+            engine_config = _make_engine_config(engine_config)
         return factory(name=name, config=engine_config, db_type=conf['db_type'])
 
     return None
 
 
 class SqlaSyncContainer(containers.DeclarativeContainer):
-    __self__ = providers.Self()
-    engine_factory = providers.Singleton(SqlaSyncEngineFactory)
+    engine_factory = providers.Singleton(get_sync_engine_factory)
     context_factory = providers.Dependency(default=SqlaSyncContext)
     force_rollback = providers.Object(False)
     engine_names = providers.List()
 
-    def _create_engine(self, name: str, config: EngineConfig, db_type: SqlEngineType, *args, **kwargs):
-        return self.engine_factory()(name, config, db_type, *args, **kwargs)
-
-    create_engine = providers.Factory(_create_engine, __self__)
+    create_engine = providers.Callable(_create_engine, engine_factory)
     instance = providers.Singleton(
         SqlaSyncResource, engine_factory=engine_factory,
         context_factory=context_factory, force_rollback=force_rollback,
@@ -63,16 +67,12 @@ class SqlaSyncContainer(containers.DeclarativeContainer):
 
 
 class SqlaAsyncContainer(containers.DeclarativeContainer):
-    __self__ = providers.Self()
-    engine_factory = providers.Singleton(SqlaAsyncEngineFactory)
+    engine_factory = providers.Singleton(get_async_engine_factory)
     context_factory = providers.Dependency(default=SqlaAsyncContext)
     force_rollback = providers.Object(False)
     engine_names = providers.List()
 
-    def _create_engine(self, name: str, config: EngineConfig, db_type: SqlEngineType, *args, **kwargs):
-        return self.engine_factory()(name, config, db_type, *args, **kwargs)
-
-    create_engine = providers.Factory(_create_engine, __self__)
+    create_engine = providers.Callable(_create_engine, engine_factory)
     instance = providers.Singleton(
         SqlaAsyncResource, engine_factory=engine_factory,
         context_factory=context_factory, force_rollback=force_rollback,
@@ -81,40 +81,34 @@ class SqlaAsyncContainer(containers.DeclarativeContainer):
 
 
 class SingleSqlaSyncContainer(SqlaSyncContainer):
-    __self__ = providers.Self()
     config = providers.Configuration()
 
-    create_engine = providers.Factory(
-        _prepare_single_engine_config, config.provider,
-        providers.Factory(SqlaSyncContainer._create_engine, __self__).provider,
+    create_engine = providers.Callable(
+        _prepare_single_engine_config, config.provider, SqlaSyncContainer.engine_factory,
     )
 
 
 class SingleSqlaAsyncContainer(SqlaAsyncContainer):
-    __self__ = providers.Self()
     config = providers.Configuration()
 
-    create_engine = providers.Factory(
-        _prepare_single_engine_config, config.provider,
-        providers.Factory(SqlaAsyncContainer._create_engine, __self__).provider,
+    create_engine = providers.Callable(
+        _prepare_single_engine_config, config.provider, SqlaAsyncContainer.engine_factory,
     )
 
 
 class MultipleSqlaSyncContainer(SqlaSyncContainer):
-    __self__ = providers.Self()
     config = providers.Configuration()
 
-    create_engine = providers.Factory(
+    create_engine = providers.Callable(
         _prepare_multiple_engine_config, config=config.provider,
-        factory=providers.Factory(SqlaSyncContainer._create_engine, __self__).provider,
+        factory=SqlaSyncContainer.engine_factory,
     )
 
 
 class MultipleSqlaAsyncContainer(SqlaAsyncContainer):
-    __self__ = providers.Self()
     config = providers.Configuration()
 
-    create_engine = providers.Factory(
+    create_engine = providers.Callable(
         _prepare_multiple_engine_config, config=config.provider,
-        factory=providers.Factory(SqlaAsyncContainer._create_engine, __self__).provider,
+        factory=SqlaAsyncContainer.engine_factory,
     )
@@ -9,14 +9,20 @@ from sqlalchemy.orm import Session as SqlaSyncSession
 
 from greyhorse_sqla.engine import SqlaAsyncEngine, SqlaSyncEngine
 
+# Set in the info dict of a session while the context which opened it is active
+_OWNED_KEY = 'greyhorse_context_owned'
+
 
 class SqlaSyncContext:
+    __slots__ = ('_engine', '_force_rollback', '_counter', '_lock', '_session', '_cm')
+
     def __init__(self, engine: SqlaSyncEngine, force_rollback: bool = True):
         self._engine = engine
         self._force_rollback = force_rollback
         self._counter = 0
         self._lock = threading.Lock()
         self._session: SqlaSyncSession | None = None
+        self._cm = None
 
     @property
     def name(self) -> str:
@@ -26,6 +32,10 @@ class SqlaSyncContext:
     def engine(self) -> SqlaSyncEngine:
         return self._engine
 
+    @property
+    def session(self) -> SqlaSyncSession | None:
+        return self._session
+
     @contextmanager
     def session_factory(self):
         yield self._session
@@ -48,8 +58,16 @@ class SqlaSyncContext:
             if 1 != self._counter:
                 return self
 
-            self._cm = self._engine.session(force_rollback=self._force_rollback)
-            self._session = self._cm.__enter__()
+            # Only a session owned by an enclosing context is borrowed,
+            # one left over in the scope is taken over and torn down on exit
+            session = self._engine.get_current_session()
+            if session is not None and session.info.get(_OWNED_KEY):
+                self._cm, self._session = None, session
+            else:
+                self._cm = self._engine.session(force_rollback=self._force_rollback)
+                self._session = self._cm.__enter__()
+                self._session.info[_OWNED_KEY] = True
+
             self._setup()
             return self
 
@@ -62,6 +80,11 @@ class SqlaSyncContext:
 
             self._teardown()
 
+            if self._cm is None:
+                self._session = None
+                return
+
+            self._session.info.pop(_OWNED_KEY, None)
             try:
                 self._cm.__exit__(*args)
             except exc.ResourceClosedError:
@@ -72,12 +95,15 @@ class SqlaSyncContext:
 
 
 class SqlaAsyncContext:
+    __slots__ = ('_engine', '_force_rollback', '_counter', '_lock', '_session', '_cm')
+
     def __init__(self, engine: SqlaAsyncEngine, force_rollback: bool = True):
         self._engine = engine
         self._force_rollback = force_rollback
         self._counter = 0
         self._lock = asyncio.Lock()
         self._session: SqlaAsyncSession | None = None
+        self._cm = None
 
     @property
     def name(self) -> str:
@@ -87,6 +113,10 @@ class SqlaAsyncContext:
     def engine(self) -> SqlaAsyncEngine:
         return self._engine
 
+    @property
+    def session(self) -> SqlaAsyncSession | None:
+        return self._session
+
     @asynccontextmanager
     async def session_factory(self):
         yield self._session
@@ -109,8 +139,14 @@ class SqlaAsyncContext:
             if 1 != self._counter:
                 return self
 
-            self._cm = self._engine.session(force_rollback=self._force_rollback)
-            self._session = await self._cm.__aenter__()
+            session = self._engine.get_current_session()
+            if session is not None and session.info.get(_OWNED_KEY):
+                self._cm, self._session = None, session
+            else:
+                self._cm = self._engine.session(force_rollback=self._force_rollback)
+                self._session = await self._cm.__aenter__()
+                self._session.info[_OWNED_KEY] = True
+
             await self._setup()
             return self
 
@@ -123,6 +159,11 @@ class SqlaAsyncContext:
 
             await self._teardown()
 
+            if self._cm is None:
+                self._session = None
+                return
+
+            self._session.info.pop(_OWNED_KEY, None)
             try:
                 await self._cm.__aexit__(*args)
             except exc.ResourceClosedError:
@@ -1,14 +1,15 @@
 import asyncio
-import sys
 import threading
 from abc import ABC, abstractmethod
-from contextlib import contextmanager, AbstractContextManager, asynccontextmanager, AbstractAsyncContextManager
+from contextlib import contextmanager, AbstractContextManager, asynccontextmanager, \
+    AbstractAsyncContextManager, nullcontext
 from datetime import timedelta
+from typing import AsyncIterator, Iterator
 
 from sqlalchemy.ext.asyncio import AsyncSession as SqlaAsyncSession, async_scoped_session, async_sessionmaker
 from sqlalchemy.orm import Session as SqlaSyncSession, scoped_session, sessionmaker
 
-from greyhorse_core.app.context import get_context
+from greyhorse_core.app.context import get_session_id
 from greyhorse_core.engines.base import SyncEngine, AsyncEngine
 from greyhorse_core.i18n import tr
 from greyhorse_core.logging import logger
@@ -57,27 +58,37 @@ class SqlaSyncEngine(SyncEngine[SqlaSyncSession], SqlaEngine):
             bind=engine, autoflush=False, expire_on_commit=False,
         )
         self._scoped_session = scoped_session(
-            self._session_factory, scopefunc=lambda: get_context().session_id
+            self._session_factory, scopefunc=get_session_id
         )
 
     @property
     def connection_class(self):
         return SqlaSyncSession
 
-    @contextmanager
+    def get_current_session(self) -> SqlaSyncSession | None:
+        if self._scoped_session.registry.has():
+            return self._scoped_session()
+        return None
+
     def session(self, begin_tx: bool = True, force_rollback: bool = False) \
             -> AbstractContextManager[SqlaSyncSession]:
-        if self._scoped_session.registry.has():
-            yield self._scoped_session()
-            return
+        # Calls within an already opened session just share it
+        if session := self.get_current_session():
+            return nullcontext(session)
+        return self._open_session(begin_tx, force_rollback)
 
+    @contextmanager
+    def _open_session(self, begin_tx: bool, force_rollback: bool) \
+            -> Iterator[SqlaSyncSession]:
         session: SqlaSyncSession = self._scoped_session()
 
         if begin_tx:
             with session.begin() as tx:
+                # Exceptions raised by the caller propagate through session.begin(),
+                # which rolls the transaction back by itself
                 yield session
 
-                if sys.exc_info()[0] or self._force_rollback or force_rollback:
+                if self._force_rollback or force_rollback:
                     tx.rollback()
                 else:
                     tx.commit()
@@ -114,27 +125,35 @@ class SqlaAsyncEngine(AsyncEngine[SqlaAsyncSession], SqlaEngine):
             bind=engine, autoflush=False, expire_on_commit=False,
         )
         self._scoped_session = async_scoped_session(
-            self._session_factory, scopefunc=lambda: get_context().session_id
+            self._session_factory, scopefunc=get_session_id
         )
 
     @property
     def connection_class(self):
         return SqlaAsyncSession
 
-    @asynccontextmanager
-    async def session(self, begin_tx: bool = True, force_rollback: bool = False) \
-            -> AbstractAsyncContextManager[SqlaAsyncSession]:
+    def get_current_session(self) -> SqlaAsyncSession | None:
         if self._scoped_session.registry.has():
-            yield self._scoped_session()
-            return
+            return self._scoped_session()
+        return None
 
+    def session(self, begin_tx: bool = True, force_rollback: bool = False) \
+            -> AbstractAsyncContextManager[SqlaAsyncSession]:
+        # Calls within an already opened session just share it
+        if session := self.get_current_session():
+            return nullcontext(session)
+        return self._open_session(begin_tx, force_rollback)
+
+    @asynccontextmanager
+    async def _open_session(self, begin_tx: bool, force_rollback: bool) \
+            -> AsyncIterator[SqlaAsyncSession]:
         session: SqlaAsyncSession = self._scoped_session()
 
         if begin_tx:
             async with session.begin() as tx:
                 yield session
 
-                if sys.exc_info()[0] or self._force_rollback or force_rollback:
+                if self._force_rollback or force_rollback:
                     await tx.rollback()
                 else:
                     await tx.commit()
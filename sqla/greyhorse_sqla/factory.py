@@ -1,12 +1,13 @@
-import re
 from collections import defaultdict
 from dataclasses import dataclass, replace
 from datetime import timedelta
+from functools import cache
 from typing import Mapping
 
 from orjson import orjson
-from sqlalchemy import create_engine as create_sync_engine
+from sqlalchemy import create_engine as create_sync_engine, make_url
 from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from greyhorse_core.engines.factory import SyncEngineFactory, AsyncEngineFactory
 from greyhorse_core.i18n import tr
@@ -15,63 +16,88 @@ from greyhorse_sqla.config import SqlEngineType, EngineConfig
 from greyhorse_sqla.engine import SqlaSyncEngine, SqlaAsyncEngine
 
 
+def _replace_scheme(dsn: str, scheme: str, new_scheme: str) -> str:
+    if dsn.startswith(scheme):
+        return new_scheme + dsn[len(scheme):]
+    return dsn
+
+
+def _json_serializer(obj) -> str:
+    return orjson.dumps(obj).decode()
+
+
 def _prepare_params(db_type: SqlEngineType, config: EngineConfig) -> dict:
     params = dict(
         echo=config.echo,
         echo_pool=config.echo,
-        pool_pre_ping=True,
+        pool_pre_ping=config.pool_pre_ping,
         pool_recycle=config.pool_expire_seconds,
-        json_serializer=orjson.dumps,
+        query_cache_size=config.query_cache_size,
+        json_serializer=_json_serializer,
         json_deserializer=orjson.loads,
     )
 
     if db_type in (SqlEngineType.POSTGRES, SqlEngineType.MYSQL):
         params.update(dict(
             pool_size=config.pool_min_size,
-            max_overflow=config.pool_max_size - config.pool_min_size,
+            max_overflow=max(0, config.pool_max_size - config.pool_min_size),
             pool_timeout=config.pool_timeout_seconds,
         ))
 
     return params
 
 
+def _check_config(
+    name: str, existing: tuple[EngineConfig, SqlEngineType],
+    config: EngineConfig, db_type: SqlEngineType,
+):
+    # Factories are shared between containers, an engine name must mean the same database
+    if existing != (config, db_type):
+        raise ValueError(f'Engine "{name}" already exists with a different configuration')
+
+
 class SqlaSyncEngineFactory(SyncEngineFactory):
     def __init__(self):
         self._engines: dict[str, SqlaSyncEngine] = dict()
-        self._engines_by_type: dict[SqlEngineType, set[str]] = defaultdict(set)
+        self._configs: dict[str, tuple[EngineConfig, SqlEngineType]] = dict()
+        self._engines_by_type: dict[SqlEngineType, dict[str, SqlaSyncEngine]] = \
+            defaultdict(dict)
 
     def get_engine_names(self) -> list[str]:
-        return list(self._engines.keys())
+        return list(self._engines)
 
     def get_engine(self, name: str) -> SqlaSyncEngine | None:
         return self._engines.get(name)
 
     def get_engines(self, names: list[str] | None = None) -> Mapping[str, SqlaSyncEngine]:
-        engines = dict()
-
         if not names:
-            names = self.get_engine_names()
+            return dict(self._engines)
+
+        engines = dict()
 
         for name in names:
-            if engine := self.get_engine(name):
+            if engine := self._engines.get(name):
                 engines[name] = engine
 
         return engines
 
     def get_engines_for_type(self, db_type: SqlEngineType) -> list[SqlaSyncEngine]:
-        engine_names = self._engines_by_type[db_type]
-        return [self.get_engine(name) for name in engine_names]
+        if engines := self._engines_by_type.get(db_type):
+            return list(engines.values())
+        return []
 
     # noinspection PyMethodOverriding
     def __call__(self, name: str, config: EngineConfig,
                  db_type: SqlEngineType, *args, **kwargs) -> SqlaSyncEngine:
         if engine := self._engines.get(name):
+            _check_config(name, self._configs[name], config, db_type)
             return engine
 
+        self._configs[name] = (config, db_type)
         dsn = config.dsn
 
         if db_type == SqlEngineType.MYSQL:
-            dsn = re.sub(r'^mysql://', lambda _: 'mysql+pymysql://', dsn)
+            dsn = _replace_scheme(dsn, 'mysql://', 'mysql+pymysql://')
 
         config = replace(config, dsn=dsn)
         params = _prepare_params(db_type, config)
@@ -85,54 +111,67 @@ class SqlaSyncEngineFactory(SyncEngineFactory):
         )
 
         self._engines[name] = engine
-        self._engines_by_type[db_type].add(name)
+        self._engines_by_type[db_type][name] = engine
         return engine
 
 
 class SqlaAsyncEngineFactory(AsyncEngineFactory):
     def __init__(self):
         self._engines: dict[str, SqlaAsyncEngine] = dict()
-        self._engines_by_type: dict[SqlEngineType, set[str]] = defaultdict(set)
+        self._configs: dict[str, tuple[EngineConfig, SqlEngineType]] = dict()
+        self._engines_by_type: dict[SqlEngineType, dict[str, SqlaAsyncEngine]] = \
+            defaultdict(dict)
 
     def get_engine_names(self) -> list[str]:
-        return list(self._engines.keys())
+        return list(self._engines)
 
     def get_engine(self, name: str) -> SqlaAsyncEngine | None:
         return self._engines.get(name)
 
     def get_engines(self, names: list[str] | None = None) -> Mapping[str, SqlaAsyncEngine]:
-        engines = dict()
-
         if not names:
-            names = self.get_engine_names()
+            return dict(self._engines)
+
+        engines = dict()
 
         for name in names:
-            if engine := self.get_engine(name):
+            if engine := self._engines.get(name):
                 engines[name] = engine
 
         return engines
 
     def get_engines_for_type(self, db_type: SqlEngineType) -> list[SqlaAsyncEngine]:
-        engine_names = self._engines_by_type[db_type]
-        return [self.get_engine(name) for name in engine_names]
+        if engines := self._engines_by_type.get(db_type):
+            return list(engines.values())
+        return []
 
     # noinspection PyMethodOverriding
     def __call__(self, name: str, config: EngineConfig,
                  db_type: SqlEngineType, *args, **kwargs) -> SqlaAsyncEngine:
         if engine := self._engines.get(name):
+            _check_config(name, self._configs[name], config, db_type)
             return engine
 
+        self._configs[name] = (config, db_type)
         dsn = config.dsn
 
         if db_type == SqlEngineType.SQLITE:
-            dsn = re.sub(r'^sqlite://', lambda _: 'sqlite+aiosqlite://', dsn)
+            dsn = _replace_scheme(dsn, 'sqlite://', 'sqlite+aiosqlite://')
         elif db_type == SqlEngineType.POSTGRES:
-            dsn = re.sub(r'^postgresql://', lambda _: 'postgresql+asyncpg://', dsn)
+            dsn = _replace_scheme(dsn, 'postgresql://', 'postgresql+asyncpg://')
         elif db_type == SqlEngineType.MYSQL:
-            dsn = re.sub(r'^mysql://', lambda _: 'mysql+aiomysql://', dsn)
+            dsn = _replace_scheme(dsn, 'mysql://', 'mysql+aiomysql://')
 
         config = replace(config, dsn=dsn)
         params = _prepare_params(db_type, config)
+        if db_type in (SqlEngineType.POSTGRES, SqlEngineType.MYSQL):
+            # Connection checkouts must wait on the event loop instead of a thread lock
+            params['poolclass'] = AsyncAdaptedQueuePool
+        # A cache size given in the DSN query takes precedence over the config
+        cache_size = config.prepared_statement_cache_size
+        if db_type == SqlEngineType.POSTGRES and cache_size is not None \
+                and 'prepared_statement_cache_size' not in make_url(config.dsn).query:
+            params['connect_args'] = dict(prepared_statement_cache_size=cache_size)
         engine = create_async_engine(config.dsn, **params)
 
         logger.info(tr('greyhorse.engines.sql.engine.created')
@@ -143,5 +182,15 @@ class SqlaAsyncEngineFactory(AsyncEngineFactory):
         )
 
         self._engines[name] = engine
-        self._engines_by_type[db_type].add(name)
+        self._engines_by_type[db_type][name] = engine
         return engine
+
+
+@cache
+def get_sync_engine_factory() -> SqlaSyncEngineFactory:
+    return SqlaSyncEngineFactory()
+
+
+@cache
+def get_async_engine_factory() -> SqlaAsyncEngineFactory:
+    return SqlaAsyncEngineFactory()
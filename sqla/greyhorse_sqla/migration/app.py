@@ -11,35 +11,42 @@ MigratorFactory = Callable[..., MigrationOperator]
 class MigrationVisitor(base.Visitor):
     def __init__(
         self, operation: str, args: Mapping[str, Any],
-        only_names: list[str] = None,
+        only_names: list[str] | None = None,
     ):
         self._operation = operation
         self._args = args
-        self._only_names = set(only_names)
-        self._dotted_path = list()
+        self._only_names = set(only_names) if only_names else None
+        self._dotted_prefix = ''
 
     def visit_service(self, instance: Service):
         if not isinstance(instance, MigrationService):
             return
 
-        name = '.'.join(self._dotted_path + [instance.name])
+        if self._only_names is not None:
+            prefix = self._dotted_prefix
+            name = f'{prefix}.{instance.name}' if prefix else instance.name
+            if name not in self._only_names:
+                return
 
-        if self._only_names is None or name in self._only_names:
-            if method := getattr(instance, self._operation, None):
-                method(**self._args)
+        if method := getattr(instance, self._operation, None):
+            method(**self._args)
 
     def visit_module(self, instance: base.Module):
-        self._dotted_path.append(instance.name)
+        prev_prefix = self._dotted_prefix
+        stack = [(instance, prev_prefix)]
 
-        for s in instance.services:
-            s.accept(self)
+        while stack:
+            module, prefix = stack.pop()
+            prefix = f'{prefix}.{module.name}' if prefix else module.name
+            self._dotted_prefix = prefix
 
-        for m in instance.modules:
-            self._dotted_path.append(m.name)
-            m.accept(self)
-            self._dotted_path.pop()
+            for s in module.services:
+                s.accept(self)
 
-        self._dotted_path.pop()
+            # Reversed to pop submodules in their declaration order
+            stack.extend((m, prefix) for m in reversed(module.modules))
+
+        self._dotted_prefix = prev_prefix
 
 
 class MigrationService(Service):
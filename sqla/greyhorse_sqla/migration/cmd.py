@@ -2,7 +2,6 @@ import click
 
 from greyhorse_core.app.visitors import BindVisitor
 from greyhorse_core.utils.imports import import_path
-from greyhorse_core.utils.invoke import invoke_sync
 from .app import MigrationVisitor
 
 
@@ -12,7 +11,7 @@ from .app import MigrationVisitor
 @click.pass_context
 def migration(ctx, app_path: str, migration_name: str):
     if app := import_path(app_path):
-        invoke_sync(app.accept(BindVisitor()))
+        app.accept(BindVisitor())
         ctx.app = app
         ctx.migration_name = migration_name
     else:
@@ -1,116 +1,137 @@
+import os
 import re
 from pathlib import Path
+from typing import Callable
 
 import alembic
 import alembic.command
 import alembic.config
 
+_CONFIGURE_LINE = '            connection=connection, target_metadata=target_metadata\n'
+
+# Replacements for exact lines of the env.py generated by `alembic init`,
+# each called with the original line and the metadata import line
+_INIT_PATCHES: dict[str, Callable[[str, str], list[str]]] = {
+    'from alembic import context\n': lambda line, metadata_import: [
+        line,
+        'from greyhorse_sqla.migration import utils\n',
+        metadata_import,
+    ],
+    'target_metadata = None\n': lambda line, _: [
+        'target_metadata = metadata\n',
+    ],
+    '        literal_binds=True,\n': lambda line, _: [
+        '        literal_binds=False,\n',
+    ],
+    '        dialect_opts={"paramstyle": "named"},\n': lambda line, _: [
+        '        include_schemas=True,\n',
+        line.replace('"', '\''),
+    ],
+    _CONFIGURE_LINE: lambda line, _: [
+        '            connection=connection, target_metadata=target_metadata,\n',
+        '            version_table_schema=target_metadata.schema,\n',
+        '            include_schemas=True,\n',
+        '            render_item=utils.render_item,\n',
+    ],
+    '        with context.begin_transaction():\n': lambda line, _: [
+        line,
+        '            if \'postgresql\' == connectable.dialect.name '
+        'and target_metadata.schema:\n',
+        '                connection.execute('
+        'f\'CREATE SCHEMA IF NOT EXISTS "{target_metadata.schema}" '
+        'AUTHORIZATION CURRENT_USER\')\n',
+        '                connection.execute('
+        'f\'set search_path to "{target_metadata.schema}", public\')\n',
+    ],
+}
+
 
 class MigrationOperator:
+    CREATE_TABLE_RE = re.compile(r'op\.create_table\(')
     TABLE_CONTENTS_RE = re.compile(
-        r'^\s+(comment=|sa.Column|sa.PrimaryKeyConstraint|'
-        r'sa.ForeignKeyConstraint|sa.UniqueConstraint|sa.CheckConstraint).+'
+        r'^[ \t]+(comment=|sa.Column|sa.PrimaryKeyConstraint|'
+        r'sa.ForeignKeyConstraint|sa.UniqueConstraint|sa.CheckConstraint).+',
+        re.MULTILINE,
     )
 
     def __init__(self, dsn: str, alembic_path: Path):
         self._alembic_path = alembic_path
+        self._alembic_path_str = str(alembic_path)
+        self._ini_path = alembic_path / 'alembic.ini'
         self._db_dsn = dsn
+        self._configs: dict[bool, alembic.config.Config] = dict()
+
+    def _get_config(self, load_ini: bool = True) -> alembic.config.Config:
+        # Without a config file env.py skips fileConfig(), keeping the application loggers
+        if (config := self._configs.get(load_ini)) is None:
+            config = alembic.config.Config(self._ini_path if load_ini else None)
+            config.set_main_option('script_location', self._alembic_path_str)
+            config.set_main_option('sqlalchemy.url', self._db_dsn)
+            self._configs[load_ini] = config
+        return config
 
     def init(self, metadata_package: str, metadata_name: str = 'metadata'):
         """
         Initialize migration directory
         """
-        config = alembic.config.Config(self._alembic_path / 'alembic.ini')
-        config.set_main_option('script_location', str(self._alembic_path))
-        config.set_main_option('sqlalchemy.url', self._db_dsn)
-
-        alembic.command.init(config, str(self._alembic_path), package=True)
+        alembic.command.init(self._get_config(), self._alembic_path_str, package=True)
+        # Parse the freshly generated alembic.ini on the next command
+        self._configs.pop(True, None)
 
         env_path = self._alembic_path / 'env.py'
         lines = list()
 
+        if metadata_name != 'metadata':
+            metadata_name += ' as metadata'
+        metadata_import = f'from {metadata_package} import {metadata_name}\n'
+
         with env_path.open('r') as f:
-            for line in f.readlines():
-                if line == 'from alembic import context\n':
-                    lines.append(line)
-                    lines.append('from greyhorse_sqla.migration import utils')
-                    if metadata_name != 'metadata':
-                        metadata_name += ' as metadata'
-                    lines.append(f'from {metadata_package} import {metadata_name}\n')
-                elif line == 'target_metadata = None\n':
-                    lines.append('target_metadata = metadata\n')
-                elif line == '        literal_binds=True,\n':
-                    lines.append('        literal_binds=False,\n')
-                elif line == '        dialect_opts={"paramstyle": "named"},\n':
-                    lines.append('        include_schemas=True,\n')
-                    lines.append(line.replace('"', '\''))
-                elif line == '            connection=connection, target_metadata=target_metadata\n':
-                    lines.append('            connection=connection, target_metadata=target_metadata,\n')
-                    lines.append('            version_table_schema=target_metadata.schema,\n')
-                    lines.append('            include_schemas=True,\n')
-                    lines.append('            render_item=utils.render_item,\n')
-                elif line == '        with context.begin_transaction():\n':
-                    lines.append(line)
-                    lines.append(
-                        '            if \'postgresql\' == connectable.dialect.name and target_metadata.schema:\n')
-                    lines.append(
-                        '                connection.execute(f\'CREATE SCHEMA IF NOT EXISTS "{target_metadata.schema}" '
-                        'AUTHORIZATION CURRENT_USER\')\n')
-                    lines.append(
-                        '                connection.execute(f\'set search_path to "{target_metadata.schema}", '
-                        'public\')\n')
+            for line in f:
+                if patch := _INIT_PATCHES.get(line):
+                    lines.extend(patch(line, metadata_import))
                 else:
                     lines.append(line)
 
         with env_path.open('w') as f:
-            f.writelines(lines)
+            f.write(''.join(lines))
 
     def new(self, name: str):
         """
         Generate new revision file
         """
         versions_dir = self._alembic_path / 'versions'
-        files_count = len(list(versions_dir.glob('*.py')))
+        with os.scandir(versions_dir) as entries:
+            files_count = sum(
+                1 for e in entries
+                if e.name.endswith('.py') and e.is_file()
+            )
         revision = f'{files_count:03d}'
 
-        config = alembic.config.Config(self._alembic_path / 'alembic.ini')
-        config.set_main_option('script_location', str(self._alembic_path))
-        config.set_main_option('sqlalchemy.url', self._db_dsn)
-
+        config = self._get_config()
         scripts = alembic.command.revision(config, message=name, autogenerate=True, rev_id=revision)
         if not isinstance(scripts, list):
             scripts = [scripts]
 
         for script in scripts:
             path = Path(script.path)
-            lines = list()
-
-            with path.open('r') as f:
-                for line in f.readlines():
-                    line = line.replace('op.create_table(', 'op.create_table(\n' + ' ' * 8)
-                    line = re.sub(self.TABLE_CONTENTS_RE, lambda _: ' ' * 4 + line.rstrip(), line)
-                    lines.append(line)
-
-            with path.open('w') as f:
-                f.writelines(lines)
+            text = path.read_text()
+            text = self.CREATE_TABLE_RE.sub('op.create_table(\n' + ' ' * 8, text)
+            text = self.TABLE_CONTENTS_RE.sub(
+                lambda m: ' ' * 4 + m.group(0).rstrip(), text,
+            )
+            path.write_text(text)
 
     def upgrade(self, offline: bool = False):
         """
         Upgrade database to head
         """
-        config = alembic.config.Config()
-        config.set_main_option('script_location', str(self._alembic_path))
-        config.set_main_option('sqlalchemy.url', self._db_dsn)
-
+        config = self._get_config(load_ini=False)
         alembic.command.upgrade(config, revision='head', sql=offline)
 
     def downgrade(self, offline: bool = False):
         """
         Downgrade database for one step
         """
-        config = alembic.config.Config()
-        config.set_main_option('script_location', str(self._alembic_path))
-        config.set_main_option('sqlalchemy.url', self._db_dsn)
         revision = 'head:-1' if offline else '-1'
-
+        config = self._get_config(load_ini=False)
         alembic.command.downgrade(config, revision=revision, sql=offline)
@@ -1,28 +1,68 @@
+from typing import Any, Callable
+
 from sqlalchemy import ARRAY, BindParameter, False_, True_
 from sqlalchemy.sql.functions import Function
 
 
+def _render_text(arg: str, sa_prefix: str, autogen_context) -> str:
+    return f'{sa_prefix}text(\'{arg}\')'
+
+
+def _render_literal(arg: BindParameter, sa_prefix: str, autogen_context) -> str:
+    value = str(arg.compile(
+        dialect=autogen_context.dialect,
+        compile_kwargs={'literal_binds': True})
+    )
+    return f'{sa_prefix}literal({value})'
+
+
+def _render_boolean(arg: False_ | True_, sa_prefix: str, autogen_context) -> str:
+    return f'{sa_prefix}{arg}()'
+
+
+def _render_function(arg: Function, sa_prefix: str, autogen_context) -> str:
+    return f'{sa_prefix}func.{arg}'
+
+
+# Keyed by exact type, subclasses are resolved in this order on first use
+_SERVER_DEFAULT_RENDERERS: dict[type, Callable[[Any, str, Any], str] | None] = {
+    str: _render_text,
+    BindParameter: _render_literal,
+    False_: _render_boolean,
+    True_: _render_boolean,
+    Function: _render_function,
+}
+
+
+def _get_server_default_renderer(arg) -> Callable[[Any, str, Any], str] | None:
+    arg_type = type(arg)
+
+    try:
+        return _SERVER_DEFAULT_RENDERERS[arg_type]
+    except KeyError:
+        pass
+
+    renderer = None
+    for base, base_renderer in _SERVER_DEFAULT_RENDERERS.items():
+        if base_renderer is not None and issubclass(arg_type, base):
+            renderer = base_renderer
+            break
+
+    _SERVER_DEFAULT_RENDERERS[arg_type] = renderer
+    return renderer
+
+
 def render_item(type_, obj, autogen_context):
     """Apply custom rendering for selected items."""
-    from sqlalchemy_utils import ChoiceType
     sa_prefix = autogen_context.opts['sqlalchemy_module_prefix']
 
     if type_ == 'server_default':
-        if isinstance(obj.arg, str):
-            return f'{sa_prefix}text(\'{obj.arg}\')'
-        elif isinstance(obj.arg, BindParameter):
-            value = str(obj.arg.compile(
-                dialect=autogen_context.dialect,
-                compile_kwargs={'literal_binds': True})
-            )
-            return f'{sa_prefix}literal({value})'
-
-        elif isinstance(obj.arg, False_ | True_):
-            return f'{sa_prefix}{obj.arg}()'
-        elif isinstance(obj.arg, Function):
-            return f'{sa_prefix}func.{obj.arg}'
+        if renderer := _get_server_default_renderer(obj.arg):
+            return renderer(obj.arg, sa_prefix, autogen_context)
 
     elif type_ == 'type':
+        from sqlalchemy_utils import ChoiceType
+
         if isinstance(obj, ChoiceType):
             return f'{sa_prefix}{repr(obj.impl)}'
         elif isinstance(obj, ARRAY):
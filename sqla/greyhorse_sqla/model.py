@@ -29,19 +29,28 @@ class SqlaModel(
         single_loader = joinedload
         list_loader = selectinload
         _column_names_map = dict()
+        _pk_attrs = tuple()
 
     # noinspection PyUnresolvedReferences
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
 
-        meta_dict = dict()
-        for t in reversed(cls.Meta.__mro__):
-            meta_dict.update({k: v for k, v in vars(t).items() if not k.startswith('__')})
-        cls.Meta = type('Meta', (FilterableModel.Meta,), meta_dict)
+        if issubclass(cls.Meta, SqlaModel.Meta):
+            cls.Meta = type('Meta', (cls.Meta,), dict())
+        else:
+            cls.Meta = type('Meta', (cls.Meta, SqlaModel.Meta), dict())
 
         cls.Meta.private_fields.update({'metadata', 'registry'})
         cls.Meta.non_serializable_fields.update({'metadata', 'registry'})
 
+        if mapper := cls.__dict__.get('__mapper__'):
+            names_map = cls.Meta._column_names_map = {
+                c.name: key for key, c in mapper.c.items()
+            }
+            cls.Meta._pk_attrs = tuple(
+                names_map[c.name] for c in cls.__table__.primary_key.columns
+            )
+
     def __init__(self, **kwargs):
         super().__init__()
 
@@ -54,7 +63,10 @@ class SqlaModel(
 
     def get_id_value(self) -> IdType:
         # noinspection PyProtectedMember
-        return self._get_column_values(self.__table__.primary_key.columns)
+        attrs = self.Meta._pk_attrs
+        if len(attrs) == 1:
+            return getattr(self, attrs[0])
+        return tuple(getattr(self, attr) for attr in attrs)
 
     @classmethod
     def get_columns(cls) -> ReadOnlyColumnCollection:
@@ -69,15 +81,15 @@ class SqlaModel(
     #
 
     def __eq__(self, other: Self):
-        return type(self) == type(other) and self.get_id_value() == other.get_id_value()
+        return type(self) is type(other) and self.get_id_value() == other.get_id_value()
 
     def __hash__(self):
-        return self.get_id_value().__hash__()
+        return hash(self.get_id_value())
 
     @classmethod
     def _get_field_by_column(cls, c: Column) -> str:
         # noinspection PyProtectedMember
-        return cls._repo._column_names_map.get(c.name)
+        return cls.Meta._column_names_map.get(c.name)
 
     def _get_column_values(
         self, columns: ColumnCollection, force_tuple: bool = False,
@@ -1,7 +1,11 @@
 from functools import reduce
-from typing import Mapping, Any, Self
+from typing import Mapping, MutableMapping, Any
 
 from sqlalchemy import Select, SQLColumnExpression, UnaryExpression, ClauseElement, Exists, Update, Delete, TextClause
+from sqlalchemy.sql.compiler import Compiled
+from sqlalchemy.util import LRUCache
+
+_compiled_cache: LRUCache[tuple, Compiled] = LRUCache(256)
 
 
 class SqlaFiltersQuery:
@@ -11,16 +15,30 @@ class SqlaFiltersQuery:
     ):
         self._expr = expr
         self._params = params
+        self._hash: int | None = None
 
     def apply(self, query: Select[Any] | Exists | Update | Delete):
-        for item in self._expr:
-            query = query.where(item)
+        if self._expr:
+            query = query.where(*self._expr)
         if self._params:
             query = query.params(**self._params)
         return query
 
-    def __eq__(self, other: Self):
-        return (self._expr, self._params) == (other._expr, other._params)
+    def __eq__(self, other: object):
+        # == on clauses builds an expression, compare their structure and values instead
+        if not isinstance(other, SqlaFiltersQuery):
+            return NotImplemented
+        return self._params == other._params and len(self._expr) == len(other._expr) \
+            and all(_clause_equals(a, b) for a, b in zip(self._expr, other._expr))
+
+    def __hash__(self):
+        # Hashed by the structure of the clauses, bound values only take part in equality
+        if self._hash is None:
+            self._hash = hash((
+                tuple(_clause_key(expr) for expr in self._expr),
+                frozenset(self._params or ()),
+            ))
+        return self._hash
 
 
 class SqlaSortingQuery:
@@ -28,22 +46,56 @@ class SqlaSortingQuery:
         self._expr = expr
 
     def apply(self, query: Select[Any]):
-        for item in self._expr:
-            query = query.order_by(item)
+        if self._expr:
+            query = query.order_by(*self._expr)
         return query
 
 
+def _clause_key(expr: Any) -> Any:
+    if isinstance(expr, ClauseElement):
+        cache_key = expr._generate_cache_key()
+        return cache_key.key if cache_key is not None else type(expr)
+    return expr
+
+
+def _clause_equals(a: Any, b: Any) -> bool:
+    if isinstance(a, ClauseElement):
+        return isinstance(b, ClauseElement) and a.compare(b)
+    return not isinstance(b, ClauseElement) and a == b
+
+
 def clause2string(clause: ClauseElement, params: dict[str, Any] | None = None) -> str:
     if params:
         clause = clause.params(params)
 
-    compiled = clause.compile(compile_kwargs={'render_postcompile': True})
+    compiled, compiled_params = _compile(clause)
     res = [compiled.string]
 
-    for k, v in compiled.params.items():
+    for k, v in compiled_params.items():
         if params and k in params:
             res.append(str(params[k]))
         else:
             res.append(str(v))
 
     return '$'.join(res)
+
+
+def _compile(clause: ClauseElement) -> tuple[Compiled, MutableMapping[str, Any]]:
+    cache_key = clause._generate_cache_key()
+
+    # Expanding and literal parameters are rendered into the string itself,
+    # so the statement can only be reused when it has none of them
+    if cache_key is None or any(
+        b.expanding or b.literal_execute for b in cache_key.bindparams
+    ):
+        compiled = clause.compile(compile_kwargs={'render_postcompile': True})
+        return compiled, compiled.params
+
+    if (compiled := _compiled_cache.get(cache_key.key)) is None:
+        compiled = clause.compile(
+            cache_key=cache_key, compile_kwargs={'render_postcompile': True},
+        )
+        _compiled_cache[cache_key.key] = compiled
+        return compiled, compiled.params
+
+    return compiled, compiled.construct_params(extracted_parameters=cache_key.bindparams)
@@ -1,12 +1,18 @@
-from functools import partial
-from typing import Callable, Type, Mapping, Any, Sequence, TypeVar, cast, Generic
-
-from sqlalchemy import update, CursorResult, select, delete, ColumnCollection, Column, inspect, tuple_, func, \
-    literal_column, exists
+import asyncio
+from contextlib import nullcontext
+from copy import copy
+from operator import itemgetter
+from types import MappingProxyType
+from typing import AsyncIterator, Callable, Type, Mapping, Any, Self, Sequence, TypeVar, \
+    cast, Generic
+
+from sqlalchemy import update, CursorResult, select, delete, Column, inspect, tuple_, \
+    func, literal_column, and_, bindparam, insert, Select, any_, ARRAY
 from sqlalchemy.exc import NoInspectionAvailable
 from sqlalchemy.ext.asyncio import AsyncSession as SqlaAsyncSession
-from sqlalchemy.orm import Session as SqlaSyncSession, attributes
+from sqlalchemy.orm import Session as SqlaSyncSession, attributes, selectinload
 from sqlalchemy.orm.base import instance_state
+from sqlalchemy.orm.interfaces import ORMOption
 
 from greyhorse_core.data.repositories.base import IdType, ModelType, ModelFactory, EntityType, EntityFactory
 from greyhorse_core.data.repositories.filterable import FilterableRepository
@@ -27,29 +33,101 @@ class SqlaRepository(
     FilterableRepository[IdType, EntityType, SqlaFiltersQuery, SqlaSortingQuery],
     Generic[IdType, EntityType],
 ):
+    ARRAY_PARAM_THRESHOLD = 100
+
     def __init__(
         self, class_: Type[EntityType],
         session_factory: AsyncSessionFactory,
         factory: EntityFactory | None = None,
+        load_options: Sequence[ORMOption] | None = None,
     ):
         super().__init__(class_, factory)
         self._session_factory = session_factory
-        self._model_factory = partial(self._construct_instances, self.entity_factory)
+        self._load_options = tuple(load_options) if load_options else tuple()
+        self._select_query = None
+        self._exists_query = None
+        self._count_query: Select | None = None
+        self._id_statements = dict()
+        self._get_batches: dict[Any, tuple[dict[IdType, None], asyncio.Task]] = dict()
 
         try:
-            column_names_map = inspect(class_).c
+            mapper = inspect(class_)
         except NoInspectionAvailable:
-            self._column_names_map = dict()
+            self._mapper = None
+            self._id_columns = tuple()
+            self._column_names_map = MappingProxyType(dict())
+            self._pk_fields = tuple()
+            self._id_getter = None
         else:
+            self._mapper = mapper
+            self._id_columns = tuple(class_.__table__.primary_key.columns)
+            column_names_map = mapper.c
             column_names_map = zip([column.name for column in column_names_map], column_names_map.keys())
-            self._column_names_map = dict(column_names_map)
-
-    def _get_id_columns(self) -> ColumnCollection:
-        return self.entity_class.__table__.primary_key.columns
+            self._column_names_map = MappingProxyType(dict(column_names_map))
+            self._pk_fields = tuple(
+                self._get_field_by_column(c) for c in self._get_id_columns()
+            )
+            # Applied to the instance dict, gives a scalar for a single primary key column
+            # and a tuple for a composite one
+            self._id_getter = itemgetter(*self._pk_fields)
+
+        # Statements built from overridden queries may depend on the call
+        self._cache_select = not self._overrides('query_for_select', 'query_get')
+        self._cache_exists = not self._overrides(
+            'query_for_exists', 'query_exists', 'query_get',
+        )
+        self._cache_delete = not self._overrides('query_for_delete', 'query_get')
+        # Objects of the session identity map would bypass a customized select
+        self._identity_lookup = self._mapper is not None and self._cache_select
+
+    def _overrides(self, *names: str) -> bool:
+        cls, base = type(self), SqlaRepository
+        return any(getattr(cls, name) is not getattr(base, name) for name in names)
+
+    def _session(self, session: SqlaAsyncSession | None = None):
+        if session is not None:
+            return nullcontext(session)
+        return self._session_factory()
+
+    def _get_id_columns(self) -> Sequence[Column]:
+        return self._id_columns
 
     def _get_field_by_column(self, c: Column) -> str:
         return self._column_names_map.get(c.name)
 
+    def _get_id_statement(self, key: str, build: Callable[[Sequence[Any]], Any]):
+        # Statements bound by primary key are built once, the id goes in as parameters
+        if (statement := self._id_statements.get(key)) is None:
+            columns = self._get_id_columns()
+            clauses = [c == bindparam(f'pk_{i}') for i, c in enumerate(columns)]
+            statement = self._id_statements[key] = build(clauses)
+        return statement
+
+    def _get_id_params(self, id_value: IdType) -> dict[str, Any]:
+        return {f'pk_{i}': val for i, val in enumerate(self._get_id_value(id_value))}
+
+    def _get_id_value(self, id_value: IdType) -> Sequence[Any]:
+        if not isinstance(id_value, (list, tuple, dict)):
+            ident_ = [id_value]
+        else:
+            ident_ = id_value
+        columns = self._get_id_columns()
+        if len(ident_) != len(columns):
+            raise ValueError(
+                f'Incorrect number of values as primary key: expected {len(columns)}, got {len(ident_)}.')
+
+        vals = []
+        for i, field in enumerate(self._pk_fields):
+            try:
+                vals.append(ident_[i])
+            except KeyError:
+                vals.append(ident_[field])
+        return vals
+
+    async def _model_factory(
+            self, _from_cache: bool = False, **kwargs: Mapping[str, Any]) -> ModelType:
+        return await self._construct_instances(self.entity_factory, _from_cache, **kwargs)
+
     async def _construct_instances(
             self, model_factory: ModelFactory, _from_cache: bool = False,
             **kwargs: Mapping[str, Any]) -> ModelType:
@@ -87,34 +165,106 @@ class SqlaRepository(
     # Retrieve operations
     #
 
-    async def get(self, id_value: IdType, **kwargs) -> ModelType | None:
-        query = self.query_get(id_value, **kwargs)
-        async with self._session_factory() as session:
-            res = await session.execute(query)
+    async def get(
+        self, id_value: IdType, session: SqlaAsyncSession | None = None, **kwargs,
+    ) -> ModelType | None:
+        if kwargs or not self._cache_select:
+            query, params = self.query_get(id_value, **kwargs), None
+        elif self._identity_lookup:
+            # Objects already loaded by the session are returned without a query
+            identity = tuple(self._get_id_value(id_value))
+            async with self._session(session) as session:
+                return await session.get(
+                    self.entity_class, identity, options=self._load_options,
+                )
+        else:
+            query = self._get_id_statement(
+                'get', lambda w: self.query_for_select().where(*w),
+            )
+            params = self._get_id_params(id_value)
+
+        async with self._session(session) as session:
+            res = await session.execute(query, params)
             return res.scalar_one_or_none()
 
-    async def get_any(self, indices: Sequence[IdType], **kwargs) -> Sequence[ModelType | None]:
-        query = self.query_any(indices, **kwargs)
-        async with self._session_factory() as session:
+    async def get_batched(self, id_value: IdType) -> ModelType | None:
+        """
+        Get an object, loading the ids requested concurrently
+        within the same session with a single query
+        """
+        if isinstance(id_value, (list, dict)):
+            return await self.get(id_value)
+
+        async with self._session() as session:
+            # Calls from other sessions never share the batch or its transaction
+            if (batch := self._get_batches.get(session)) is None:
+                ids: dict[IdType, None] = dict()
+                task = asyncio.create_task(self._load_batch(session, ids))
+                batch = self._get_batches[session] = ids, task
+            batch[0][id_value] = None
+            # The load is not owned by any caller, cancelling one leaves it running
+            objects = await asyncio.shield(batch[1])
+            return objects[id_value]
+
+    async def _load_batch(
+        self, session: SqlaAsyncSession, ids: dict[IdType, None],
+    ) -> dict[IdType, ModelType | None]:
+        try:
+            # Let the concurrent callers join the batch before querying
+            await asyncio.sleep(0)
+        finally:
+            del self._get_batches[session]
+        return dict(zip(ids, await self.get_any(list(ids), session=session)))
+
+    async def get_any(
+        self, indices: Sequence[IdType],
+        session: SqlaAsyncSession | None = None, **kwargs,
+    ) -> Sequence[ModelType | None]:
+        async with self._session(session) as session:
+            # Long IN lists are expanded per parameter, PostgreSQL takes a single array
+            if len(indices) > self.ARRAY_PARAM_THRESHOLD \
+                    and session.get_bind().dialect.name == 'postgresql':
+                query = self.query_any_array(indices, **kwargs)
+            else:
+                query = self.query_any(indices, **kwargs)
             res = await session.scalars(query)
             objects = res.all()
-        objects = {obj.get_id_value(): obj for obj in objects if obj is not None}
-        return [objects[id_value] if id_value in objects else None for id_value in indices]
+        if (id_getter := self._id_getter) is None:
+            objects = {obj.get_id_value(): obj for obj in objects}
+        else:
+            # Primary keys of loaded rows are always populated, skip the descriptors
+            objects = {id_getter(obj.__dict__): obj for obj in objects}
+        return [objects.get(id_value) for id_value in indices]
 
     async def list(
         self, filters: SqlaFiltersQuery | None = None,
         sorting: SqlaSortingQuery | None = None,
-        skip: int = 0, limit: int = 0, **kwargs,
+        skip: int = 0, limit: int = 0,
+        session: SqlaAsyncSession | None = None, **kwargs,
     ) -> Sequence[ModelType]:
         query = self.query_list(filters, sorting, skip, limit, **kwargs)
-        async with self._session_factory() as session:
+        async with self._session(session) as session:
             res = await session.scalars(query)
             return res.all()
 
+    async def iter_list(
+        self, filters: SqlaFiltersQuery | None = None,
+        sorting: SqlaSortingQuery | None = None,
+        skip: int = 0, limit: int = 0, chunk_size: int = 1000,
+        session: SqlaAsyncSession | None = None, **kwargs,
+    ) -> AsyncIterator[ModelType]:
+        query = self.query_list(filters, sorting, skip, limit, **kwargs)
+        query = query.execution_options(yield_per=chunk_size)
+        async with self._session(session) as session:
+            res = await session.stream_scalars(query)
+            async for obj in res:
+                yield obj
+
     async def sublist(
         self, field, filters: SqlaFiltersQuery | None = None,
         sorting: SqlaSortingQuery | None = None,
-        skip: int = 0, limit: int = 0, **kwargs,
+        skip: int = 0, limit: int = 0,
+        session: SqlaAsyncSession | None = None, **kwargs,
     ) -> Sequence[EntityType]:
         query = field.select().offset(skip if skip >= 0 else 0)
         if limit > 0:
@@ -128,23 +278,44 @@ class SqlaRepository(
         if execution_options := kwargs.get('execution_options'):
             query = query.execution_options(**execution_options)
 
-        async with self._session_factory() as session:
+        async with self._session(session) as session:
             res = await session.scalars(query)
             return res.all()
 
-    async def count(self, filters: SqlaFiltersQuery | None = None, **kwargs) -> int:
+    async def count(
+        self, filters: SqlaFiltersQuery | None = None,
+        session: SqlaAsyncSession | None = None, **kwargs,
+    ) -> int:
         query = self.query_count(filters, **kwargs)
-        async with self._session_factory() as session:
+        async with self._session(session) as session:
             return await session.scalar(query)
 
-    async def exists(self, id_value: IdType, **kwargs) -> bool:
-        query = self.query_exists(id_value, **kwargs)
-        async with self._session_factory() as session:
-            return bool(await session.scalar(query))
-
-    async def exists_by(self, filters: SqlaFiltersQuery, **kwargs) -> bool:
+    async def exists(
+        self, id_value: IdType, session: SqlaAsyncSession | None = None, **kwargs,
+    ) -> bool:
+        if kwargs or not self._cache_exists:
+            query = self.query_exists(id_value, **kwargs)
+            async with self._session(session) as session:
+                return bool(await session.scalar(query))
+
+        query = self._get_id_statement(
+            'exists', lambda w: self.query_for_exists().where(*w),
+        )
+        params = self._get_id_params(id_value)
+
+        async with self._session(session) as session:
+            if self._identity_lookup:
+                key = self._mapper.identity_key_from_primary_key(list(params.values()))
+                if key in session.identity_map:
+                    return True
+            return bool(await session.scalar(query, params))
+
+    async def exists_by(
+        self, filters: SqlaFiltersQuery,
+        session: SqlaAsyncSession | None = None, **kwargs,
+    ) -> bool:
         query = self.query_exists_by(filters, **kwargs)
-        async with self._session_factory() as session:
+        async with self._session(session) as session:
             return bool(await session.scalar(query))
 
     async def load(self, instance: ModelType, only: Sequence[str] | None = None) -> bool:
@@ -169,13 +340,48 @@ class SqlaRepository(
             await session.flush(objects=[instance])
         return instance
 
+    async def create_detached(self, data: Mapping[str, Any], **kwargs) -> EntityType:
+        """
+        Insert a row with a single statement and construct an object from it
+        without attaching it to the session, so it is neither tracked in the
+        identity map nor gets server side defaults loaded besides the primary key
+        """
+        query = insert(self.entity_class).values(**data)
+        async with self._session_factory() as session:
+            cursor = cast(CursorResult, await session.execute(query))
+            id_value = dict(zip(self._pk_fields, cursor.inserted_primary_key))
+        return await self.construct({**data, **id_value}, **kwargs)
+
+    async def insert_many(self, data: Sequence[Mapping[str, Any]]) -> int:
+        """
+        Insert rows without constructing objects, all rows must have the same keys
+        """
+        if not data:
+            return 0
+
+        async with self._session_factory() as session:
+            await session.execute(insert(self.entity_class), data)
+            return len(data)
+
     async def update_by_id(self, id_value: IdType, data: Mapping[str, Any], **kwargs) -> bool:
         query = self.query_get(id_value, query=update(self.entity_class).values(**data))
         async with self._session_factory() as session:
             cursor = cast(CursorResult, await session.execute(query))
             return cursor.rowcount == 1
 
-    async def update_by(self, filters: SqlaFiltersQuery, data: Mapping[str, Any], **kwargs) -> int:
+    async def update_any(
+        self, indices: Sequence[IdType], data: Mapping[str, Any], **kwargs,
+    ) -> int:
+        query = self.query_for_update(**kwargs).values(**data)
+        query = self.query_any(indices, query=query)
+        async with self._session_factory() as session:
+            cursor = cast(CursorResult, await session.execute(query))
+            # noinspection PyTypeChecker
+            return cursor.rowcount
+
+    async def update_by(
+        self, filters: SqlaFiltersQuery, data: Mapping[str, Any], **kwargs,
+    ) -> int:
         query = self.query_update(filters, **kwargs).values(**data)
         async with self._session_factory() as session:
             cursor = cast(CursorResult, await session.execute(query))
@@ -194,13 +400,17 @@ class SqlaRepository(
             await session.flush(objects=[instance])
             return True
 
-    async def save_all(self, objects: Sequence[ModelType], **kwargs) -> bool:
-        async with self._session_factory() as session:
-            for obj in objects:
-                session.add(obj)
+    async def save_all(
+        self, objects: Sequence[ModelType], batch_size: int | None = None, **kwargs,
+    ) -> bool:
+        batch_size = batch_size or len(objects) or 1
 
-            await session.run_sync(lambda s: s.bulk_save_objects(objects))
-            await session.flush(objects=objects)
+        # Pending objects of a mapper are inserted in pages by the flush itself
+        async with self._session_factory() as session:
+            for i in range(0, len(objects), batch_size):
+                batch = objects[i:i + batch_size]
+                session.add_all(batch)
+                await session.flush(objects=batch)
             return True
 
     async def delete(self, instance: ModelType) -> bool:
@@ -224,9 +434,16 @@ class SqlaRepository(
             return cursor.rowcount
 
     async def delete_by_id(self, id_value: IdType) -> bool:
-        query = self.query_get(id_value, query=self.query_for_delete())
+        if self._cache_delete:
+            query = self._get_id_statement(
+                'delete', lambda w: self.query_for_delete().where(*w),
+            )
+            params = self._get_id_params(id_value)
+        else:
+            query = self.query_get(id_value, query=self.query_for_delete())
+            params = None
         async with self._session_factory() as session:
-            cursor = cast(CursorResult, await session.execute(query))
+            cursor = cast(CursorResult, await session.execute(query, params))
             return 1 == cursor.rowcount
 
     async def delete_by(self, filters: SqlaFiltersQuery, **kwargs) -> int:
@@ -241,7 +458,40 @@ class SqlaRepository(
     #
 
     def query_for_select(self, **kwargs):
-        return select(self.entity_class)
+        # Statements are generative, so the base one is built once and reused
+        if self._select_query is None:
+            query = select(self.entity_class)
+            if self._load_options:
+                query = query.options(*self._load_options)
+            self._select_query = query
+
+        query = self._select_query
+        if options := kwargs.get('options'):
+            query = query.options(*options)
+        if execution_options := kwargs.get('execution_options'):
+            query = query.execution_options(**execution_options)
+        return query
+
+    def with_eager(self, *fields: str) -> Self:
+        """
+        Return a copy of the repository loading the given relationships
+        of the selected objects with an additional query each
+        """
+        repo = copy(self)
+        repo._load_options = self._load_options + tuple(
+            selectinload(getattr(self.entity_class, name)) for name in fields
+        )
+        repo._select_query = None
+        repo._id_statements = dict()
+        repo._get_batches = dict()
+        return repo
+
+    def query_for_exists(self, **kwargs):
+        # A plain row probe instead of SELECT EXISTS(...), no row means false
+        if self._exists_query is None:
+            self._exists_query = select(literal_column('1')) \
+                .select_from(self.entity_class).limit(1)
+        return self._exists_query
 
     def query_for_update(self, **kwargs):
         return update(self.entity_class)
@@ -250,58 +500,53 @@ class SqlaRepository(
         return delete(self.entity_class)
 
     def query_get(self, id_value: IdType, query=None, **kwargs):
-        if not isinstance(id_value, (list, tuple, dict)):
-            ident_ = [id_value]
-        else:
-            ident_ = id_value
-        columns = self._get_id_columns()
-        if len(ident_) != len(columns):
-            raise ValueError(
-                f'Incorrect number of values as primary key: expected {len(columns)}, got {len(ident_)}.')
-
+        vals = self._get_id_value(id_value)
         clause = query if query is not None else self.query_for_select(**kwargs)
-        for i, c in enumerate(columns):
-            try:
-                val = ident_[i]
-            except KeyError:
-                val = ident_[self._get_field_by_column(c)]
-            clause = clause.where(c == val)
-        return clause
+        return clause.where(*[c == val for c, val in zip(self._get_id_columns(), vals)])
 
     def query_any(self, indices: Sequence[IdType], query=None, **kwargs):
         columns = self._get_id_columns()
         clause = query if query is not None else self.query_for_select(**kwargs)
-        vals_clause = []
-
-        for ident in indices:
-            if not isinstance(ident, (list, tuple, dict)):
-                ident_ = [ident]
-            else:
-                ident_ = ident
-
-            if len(ident_) != len(columns):
-                raise ValueError(
-                    f'Incorrect number of values as primary key: expected {len(columns)}, got {len(ident_)}.')
-
-            vals = []
-            for i, c in enumerate(columns):
-                try:
-                    val = ident_[i]
-                except KeyError:
-                    val = ident_[self._get_field_by_column(c)]
-                vals.append(val)
-
-            if len(vals) == 1:
-                vals_clause.append(vals[0])
-            elif len(vals) > 1:
-                vals_clause.append((*vals,))
+        vals_clause = self._get_id_values(indices)
 
         if len(columns) == 1:
-            clause = clause.where(columns[columns.keys()[0]].in_(vals_clause))
+            clause = clause.where(columns[0].in_(vals_clause))
         elif len(columns) > 1:
             clause = clause.where(tuple_(*columns).in_(vals_clause))
         return clause
 
+    def query_any_array(self, indices: Sequence[IdType], query=None, **kwargs):
+        columns = self._get_id_columns()
+        clause = query if query is not None else self.query_for_select(**kwargs)
+        vals_clause = list(dict.fromkeys(self._get_id_values(indices)))
+
+        # Ids are bound as arrays, one parameter per column keeps the statement cacheable
+        if len(columns) == 1:
+            ids = bindparam('ids', vals_clause, type_=ARRAY(columns[0].type))
+            return clause.where(columns[0] == any_(ids))
+
+        arrays = [
+            bindparam(f'ids_{i}', [val[i] for val in vals_clause], type_=ARRAY(c.type))
+            for i, c in enumerate(columns)
+        ]
+        rows = func.unnest(*arrays).table_valued(*[c.name for c in columns]).alias('ids')
+        return clause.join(rows, and_(*[c == rows.c[c.name] for c in columns]))
+
+    def _get_id_values(self, indices: Sequence[IdType]) -> Sequence[Any]:
+        get_id_value = self._get_id_value
+        arity = len(self._get_id_columns())
+
+        # Ids already in the shape of the IN clause are taken as is
+        if arity == 1:
+            return [
+                get_id_value(ident)[0] if isinstance(ident, (list, tuple, dict))
+                else ident for ident in indices
+            ]
+        return [
+            ident if isinstance(ident, tuple) and len(ident) == arity
+            else tuple(get_id_value(ident)) for ident in indices
+        ]
+
     def query_list(
         self, filters: SqlaFiltersQuery | None = None,
         sorting: SqlaSortingQuery | None = None,
@@ -317,18 +562,21 @@ class SqlaRepository(
         return query
 
     def query_count(self, filters: SqlaFiltersQuery | None = None, **kwargs):
-        if filters:
-            query = filters.apply(self.query_for_select())
-        else:
-            query = self.entity_class.__table__
-
+        if not filters:
+            # Counting the whole table does not depend on the call, build it once
+            if self._count_query is None:
+                self._count_query = select(func.count(literal_column('1'))) \
+                    .select_from(self.entity_class.__table__.alias())
+            return self._count_query
+
+        query = filters.apply(self.query_for_select())
         return select(func.count(literal_column('1'))).select_from(query.alias())
 
     def query_exists(self, id_value: IdType, **kwargs):
-        return self.query_get(id_value, query=exists(), **kwargs).select()
+        return self.query_get(id_value, query=self.query_for_exists(**kwargs), **kwargs)
 
     def query_exists_by(self, filters: SqlaFiltersQuery, **kwargs):
-        return filters.apply(exists(self.entity_class)).select()
+        return filters.apply(self.query_for_exists(**kwargs))
 
     def query_update(self, filters: SqlaFiltersQuery, **kwargs):
         return filters.apply(self.query_for_update(**kwargs))
@@ -344,6 +592,7 @@ class SqlaModelRepository(
         self, model_class: Type[SqlaModelType],
         session_factory: AsyncSessionFactory,
         model_factory: SqlaModelTypeFactory | None = None,
+        load_options: Sequence[ORMOption] | None = None,
     ):
-        super().__init__(model_class, session_factory, model_factory)
+        super().__init__(model_class, session_factory, model_factory, load_options)
         model_class.bind(self)
@@ -1,10 +1,11 @@
+import asyncio
 from typing import Mapping
 
 from dependency_injector.containers import Container
 
 from greyhorse_core.app import base
 from greyhorse_core.app.context import get_context
-from greyhorse_sqla.contexts import SqlaSyncContextFactory, SqlaSyncContext, SqlaAsyncContextFactory, SqlaAsyncContext
+from greyhorse_sqla.contexts import SqlaSyncContextFactory, SqlaAsyncContextFactory
 from greyhorse_sqla.engine import SqlaSyncEngine, SqlaAsyncEngine
 from greyhorse_sqla.factory import SqlaSyncEngineFactory, SqlaAsyncEngineFactory
 
@@ -24,20 +25,27 @@ class SqlaSyncResource(base.Resource, base.HasContainer):
         self._context_factory = context_factory
         self._force_rollback = force_rollback
         self._engine_names = engine_names or list()
+        self._engines: dict[str, SqlaSyncEngine] = dict()
+        self._engines_reversed: tuple[SqlaSyncEngine, ...] = tuple()
 
     @property
     def engines(self) -> Mapping[str, SqlaSyncEngine]:
-        return self._engine_factory.get_engines()
+        return self._engines
 
     def create(
         self, application: base.Application,
         module: base.Module | None = None,
         service: base.Service | None = None,
     ):
-        for name in self._engine_names:
-            self.container.create_engine(name)
+        # The engine factory may be shared with other containers,
+        # so only the engines created here are owned by this resource
+        if self._engine_names:
+            engines = [self.container.create_engine(name) for name in self._engine_names]
         else:
-            self.container.create_engine()
+            engines = [self.container.create_engine()]
+
+        self._engines = {engine.name: engine for engine in engines if engine}
+        self._engines_reversed = tuple(reversed(self._engines.values()))
 
         for engine in self.engines.values():
             engine.start()
@@ -47,7 +55,7 @@ class SqlaSyncResource(base.Resource, base.HasContainer):
         module: base.Module | None = None,
         service: base.Service | None = None,
     ):
-        for engine in reversed(self.engines.values()):
+        for engine in self._engines_reversed:
             engine.stop()
 
     def acquire(
@@ -56,18 +64,13 @@ class SqlaSyncResource(base.Resource, base.HasContainer):
         service: base.Service | None = None,
     ):
         ctx_storage = get_context()
+        if 'sqla' not in ctx_storage:
+            ctx_storage.sqla = dict()
+        contexts = ctx_storage.sqla
 
         for name, engine in self.engines.items():
             ctx = self._context_factory(engine, self._force_rollback)
-
-            if 'sqla' not in ctx_storage:
-                ctx_storage.sqla = ctx
-            elif isinstance(ctx_storage.sqla, SqlaSyncContext):
-                prev_ctx = ctx_storage.sqla
-                ctx_storage.sqla = {prev_ctx.name: prev_ctx, name: ctx}
-            else:
-                ctx_storage.sqla[name] = ctx
-
+            contexts[name] = ctx
             ctx.__enter__()
 
     def release(
@@ -76,21 +79,17 @@ class SqlaSyncResource(base.Resource, base.HasContainer):
         service: base.Service | None = None,
     ):
         ctx_storage = get_context()
+        if 'sqla' not in ctx_storage:
+            return
+        contexts = ctx_storage.sqla
 
-        for name, engine in self.engines.items():
-            if 'sqla' not in ctx_storage:
-                break
-            elif isinstance(ctx_storage.sqla, SqlaSyncContext):
-                ctx = ctx_storage.sqla
-                del ctx_storage.sqla
-            else:
-                ctx = ctx_storage.sqla.pop(name, None)
-
-            if ctx:
+        # Contexts are exited in the reverse order of acquiring
+        for engine in self._engines_reversed:
+            if ctx := contexts.pop(engine.name, None):
                 ctx.__exit__(None, None, None)
 
     def get_engine(self, name: str) -> SqlaSyncEngine | None:
-        return self._engine_factory.get_engine(name)
+        return self._engines.get(name)
 
 
 class SqlaAsyncResource(base.Resource, base.HasContainer):
@@ -108,31 +107,36 @@ class SqlaAsyncResource(base.Resource, base.HasContainer):
         self._context_factory = context_factory
         self._force_rollback = force_rollback
         self._engine_names = engine_names or list()
+        self._engines: dict[str, SqlaAsyncEngine] = dict()
+        self._engines_reversed: tuple[SqlaAsyncEngine, ...] = tuple()
 
     @property
     def engines(self) -> Mapping[str, SqlaAsyncEngine]:
-        return self._engine_factory.get_engines()
+        return self._engines
 
     async def create(
         self, application: base.Application,
         module: base.Module | None = None,
         service: base.Service | None = None,
     ):
-        for name in self._engine_names:
-            self.container.create_engine(name)
+        # The engine factory may be shared with other containers,
+        # so only the engines created here are owned by this resource
+        if self._engine_names:
+            engines = [self.container.create_engine(name) for name in self._engine_names]
         else:
-            self.container.create_engine()
+            engines = [self.container.create_engine()]
 
-        for engine in self.engines.values():
-            await engine.start()
+        self._engines = {engine.name: engine for engine in engines if engine}
+        self._engines_reversed = tuple(reversed(self._engines.values()))
+
+        await asyncio.gather(*(engine.start() for engine in self.engines.values()))
 
     async def destroy(
         self, application: base.Application,
         module: base.Module | None = None,
         service: base.Service | None = None,
     ):
-        for engine in reversed(self.engines.values()):
-            await engine.stop()
+        await asyncio.gather(*(engine.stop() for engine in self._engines_reversed))
 
     async def acquire(
         self, application: base.Application,
@@ -140,18 +144,13 @@ class SqlaAsyncResource(base.Resource, base.HasContainer):
         service: base.Service | None = None,
     ):
         ctx_storage = get_context()
+        if 'sqla' not in ctx_storage:
+            ctx_storage.sqla = dict()
+        contexts = ctx_storage.sqla
 
         for name, engine in self.engines.items():
             ctx = self._context_factory(engine, self._force_rollback)
-
-            if 'sqla' not in ctx_storage:
-                ctx_storage.sqla = ctx
-            elif isinstance(ctx_storage.sqla, SqlaAsyncContext):
-                prev_ctx = ctx_storage.sqla
-                ctx_storage.sqla = {prev_ctx.name: prev_ctx, name: ctx}
-            else:
-                ctx_storage.sqla[name] = ctx
-
+            contexts[name] = ctx
             await ctx.__aenter__()
 
     async def release(
@@ -160,18 +159,14 @@ class SqlaAsyncResource(base.Resource, base.HasContainer):
         service: base.Service | None = None,
     ):
         ctx_storage = get_context()
+        if 'sqla' not in ctx_storage:
+            return
+        contexts = ctx_storage.sqla
 
-        for name, engine in self.engines.items():
-            if 'sqla' not in ctx_storage:
-                break
-            elif isinstance(ctx_storage.sqla, SqlaAsyncContext):
-                ctx = ctx_storage.sqla
-                del ctx_storage.sqla
-            else:
-                ctx = ctx_storage.sqla.pop(name, None)
-
-            if ctx:
+        # Contexts are exited in the reverse order of acquiring
+        for engine in self._engines_reversed:
+            if ctx := contexts.pop(engine.name, None):
                 await ctx.__aexit__(None, None, None)
 
     def get_engine(self, name: str) -> SqlaAsyncEngine | None:
-        return self._engine_factory.get_engine(name)
+        return self._engines.get(name)
@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from greyhorse_sqla.config import EngineConfig, SqlEngineType
 from greyhorse_sqla.containers import MultipleSqlaAsyncContainer, MultipleSqlaSyncContainer, SingleSqlaAsyncContainer, \
     SingleSqlaSyncContainer, SqlaAsyncContainer, SqlaSyncContainer
@@ -50,13 +52,14 @@ def test_single_sync_container():
     container.config.from_dict({
         'name': 'test_single_sync',
         'db_type': SqlEngineType.SQLITE,
-        'engine_config': {'dsn': SQLITE_URI},
+        'engine_config': {'dsn': SQLITE_URI, 'pool_timeout_seconds': '5'},
     })
 
     engine = container.create_engine()
 
     assert isinstance(engine, SqlaSyncEngine)
     assert engine.name == 'test_single_sync'
+    assert engine.timeout == timedelta(seconds=5)
     assert engine is container.create_engine()
 
     resource = container.instance(container=container)
@@ -1,7 +1,11 @@
+from unittest import mock
+
 import pytest
+import pytest_asyncio
 from sqlalchemy import text
 
 from greyhorse_sqla.config import EngineConfig, SqlEngineType
+from greyhorse_sqla.contexts import SqlaSyncContext
 from greyhorse_sqla.engine import SqlaAsyncEngine, SqlaSyncEngine
 from greyhorse_sqla.factory import SqlaAsyncEngineFactory, SqlaSyncEngineFactory
 from .conf import MYSQL_URI, POSTGRES_URI, SQLITE_URI
@@ -55,130 +59,128 @@ def test_async_factory():
     assert [engine] == factory.get_engines_for_type(SqlEngineType.SQLITE)
 
 
-def test_sync_sqlite_engine():
-    config = EngineConfig(
-        dsn=SQLITE_URI,
-        pool_min_size=1, pool_max_size=2,
-        pool_expire_seconds=15, pool_timeout_seconds=15,
-    )
-
+def test_factory_engine_config():
     factory = SqlaSyncEngineFactory()
-    engine = factory('test', config, SqlEngineType.SQLITE)
+    config = EngineConfig(dsn=SQLITE_URI)
 
-    engine.start()
-
-    with engine.session() as conn:
-        res = conn.execute(text('select sqlite_version();'))
-        print(res.fetchone()[0])
-        res = conn.execute(text('select 1 + 2;'))
-        assert res.fetchone()[0] == 3
-
-    engine.stop()
+    engine = factory('test', config, SqlEngineType.SQLITE)
+    assert engine is factory('test', EngineConfig(dsn=SQLITE_URI), SqlEngineType.SQLITE)
 
+    with pytest.raises(ValueError):
+        factory('test', EngineConfig(dsn='sqlite:///other.sqlite'), SqlEngineType.SQLITE)
+    with pytest.raises(ValueError):
+        factory('test', config, SqlEngineType.POSTGRES)
+    assert factory.get_engine('test') is engine
 
-@pytest.mark.asyncio
-async def test_async_sqlite_engine():
-    config = EngineConfig(
-        dsn=SQLITE_URI,
-        pool_min_size=1, pool_max_size=2,
-        pool_expire_seconds=15, pool_timeout_seconds=15,
-    )
 
-    factory = SqlaAsyncEngineFactory()
-    engine = factory('test', config, SqlEngineType.SQLITE)
+@pytest.mark.parametrize(('dsn', 'cache_size', 'connect_args'), (
+    ('postgresql://localhost/db', None, None),
+    ('postgresql://localhost/db', 100, dict(prepared_statement_cache_size=100)),
+    ('postgresql://localhost/db?prepared_statement_cache_size=0', 100, None),
+))
+def test_prepared_statement_cache_size(dsn, cache_size, connect_args):
+    config = EngineConfig(dsn=dsn, prepared_statement_cache_size=cache_size)
 
-    await engine.start()
+    with mock.patch('greyhorse_sqla.factory.create_async_engine') as create_engine:
+        SqlaAsyncEngineFactory()('test', config, SqlEngineType.POSTGRES)
 
-    async with engine.session() as conn:
-        res = await conn.execute(text('select sqlite_version();'))
-        print(res.fetchone()[0])
-        res = await conn.execute(text('select 1 + 2;'))
-        assert res.fetchone()[0] == 3
+    assert create_engine.call_args.kwargs.get('connect_args') == connect_args
 
-    await engine.stop()
 
+def test_pool_pre_ping():
+    factory = SqlaSyncEngineFactory()
 
-def test_sync_postgres_engine():
-    config = EngineConfig(
-        dsn=POSTGRES_URI,
+    engine = factory('test', EngineConfig(dsn=SQLITE_URI), SqlEngineType.SQLITE)
+    assert not engine.raw_engine.pool._pre_ping
+
+    config = EngineConfig(dsn=SQLITE_URI, pool_pre_ping=True)
+    engine = factory('test-ping', config, SqlEngineType.SQLITE)
+    assert engine.raw_engine.pool._pre_ping
+
+
+_ENGINE_PARAMS = dict(
+    params=(
+        (SQLITE_URI, SqlEngineType.SQLITE),
+        (POSTGRES_URI, SqlEngineType.POSTGRES),
+        (MYSQL_URI, SqlEngineType.MYSQL),
+    ),
+    ids=(
+        'SQLite',
+        'Postgres',
+        'MySQL',
+    ),
+)
+
+_VERSION_QUERIES = {
+    SqlEngineType.SQLITE: 'select sqlite_version();',
+    SqlEngineType.POSTGRES: 'select version();',
+    SqlEngineType.MYSQL: 'select version();',
+}
+
+
+def _engine_config(dsn: str) -> EngineConfig:
+    return EngineConfig(
+        dsn=dsn,
         pool_min_size=1, pool_max_size=2,
         pool_expire_seconds=15, pool_timeout_seconds=15,
     )
 
-    factory = SqlaSyncEngineFactory()
-    engine = factory('test', config, SqlEngineType.POSTGRES)
 
+@pytest.fixture(scope='module', **_ENGINE_PARAMS)
+def sync_engine(request):
+    dsn, engine_type = request.param
+
+    factory = SqlaSyncEngineFactory()
+    engine = factory('test', _engine_config(dsn), engine_type)
     engine.start()
 
-    with engine.session() as conn:
-        res = conn.execute(text('select version();'))
-        print(res.fetchone()[0])
-        res = conn.execute(text('select 1 + 2;'))
-        assert res.fetchone()[0] == 3
+    yield engine
 
     engine.stop()
 
 
-@pytest.mark.asyncio
-async def test_async_postgres_engine():
-    config = EngineConfig(
-        dsn=POSTGRES_URI,
-        pool_min_size=1, pool_max_size=2,
-        pool_expire_seconds=15, pool_timeout_seconds=15,
-    )
+@pytest_asyncio.fixture(scope='module', **_ENGINE_PARAMS)
+async def async_engine(request):
+    dsn, engine_type = request.param
 
     factory = SqlaAsyncEngineFactory()
-    engine = factory('test', config, SqlEngineType.POSTGRES)
-
+    engine = factory('test', _engine_config(dsn), engine_type)
     await engine.start()
 
-    async with engine.session() as conn:
-        res = await conn.execute(text('select version();'))
-        print(res.fetchone()[0])
-        res = await conn.execute(text('select 1 + 2;'))
-        assert res.fetchone()[0] == 3
+    yield engine
 
     await engine.stop()
 
 
-def test_sync_mysql_engine():
-    config = EngineConfig(
-        dsn=MYSQL_URI,
-        pool_min_size=1, pool_max_size=2,
-        pool_expire_seconds=15, pool_timeout_seconds=15,
-    )
-
-    factory = SqlaSyncEngineFactory()
-    engine = factory('test', config, SqlEngineType.MYSQL)
-
-    engine.start()
-
-    with engine.session() as conn:
-        res = conn.execute(text('select version();'))
-        print(res.fetchone()[0])
+def test_sync_engine(sync_engine):
+    with sync_engine.session() as conn:
+        res = conn.execute(text(_VERSION_QUERIES[sync_engine.db_type]))
+        assert res.fetchone()[0]
         res = conn.execute(text('select 1 + 2;'))
         assert res.fetchone()[0] == 3
 
-    engine.stop()
-
 
-@pytest.mark.asyncio
-async def test_async_mysql_engine():
-    config = EngineConfig(
-        dsn=MYSQL_URI,
-        pool_min_size=1, pool_max_size=2,
-        pool_expire_seconds=15, pool_timeout_seconds=15,
-    )
+def test_sync_context_session(sync_engine):
+    with SqlaSyncContext(sync_engine) as outer:
+        with SqlaSyncContext(sync_engine) as inner:
+            assert inner.session is outer.session
+        assert sync_engine.get_current_session() is outer.session
+    assert sync_engine.get_current_session() is None
 
-    factory = SqlaAsyncEngineFactory()
-    engine = factory('test', config, SqlEngineType.MYSQL)
+    # A session left over in the scope is not shared, the context tears it down
+    with sync_engine.session(begin_tx=False) as stale:
+        pass
+    with SqlaSyncContext(sync_engine) as ctx:
+        assert ctx.session is stale
+    with sync_engine.session() as session:
+        assert session is not stale
+    sync_engine.teardown_session()
 
-    await engine.start()
 
-    async with engine.session() as conn:
-        res = await conn.execute(text('select version();'))
-        print(res.fetchone()[0])
+@pytest.mark.asyncio
+async def test_async_engine(async_engine):
+    async with async_engine.session() as conn:
+        res = await conn.execute(text(_VERSION_QUERIES[async_engine.db_type]))
+        assert res.fetchone()[0]
         res = await conn.execute(text('select 1 + 2;'))
         assert res.fetchone()[0] == 3
-
-    await engine.stop()
@@ -1,9 +1,10 @@
 from datetime import datetime
 from datetime import datetime
+from functools import lru_cache
 from unittest import mock
 
 import pytest
-from sqlalchemy import DateTime, func, String
+from sqlalchemy import DateTime, func, String, text
 from sqlalchemy.orm import Mapped, mapped_column as C
 
 from greyhorse_sqla.model import SqlaModel
@@ -244,3 +245,36 @@ async def test_delete_by():
     repo_mock.delete_by.return_value = 1
     assert 1 == await TestModel.delete_by(Q([0]))
     repo_mock.delete_by.assert_called_once_with(Q([0]))
+
+
+def test_filters_hash():
+    query = Q([TestModel.data == '1'])
+    assert hash(query) == hash(query)
+    assert hash(query) == hash(Q([TestModel.data == '2']))
+    assert hash(query) != hash(Q([TestModel.id == 1]))
+    assert hash(Q([0], params=dict(a=1))) == hash(Q([0], params=dict(a=2)))
+    assert {query: 1}[query] == 1
+
+
+def test_filters_cache_lookup():
+    calls = []
+
+    @lru_cache
+    def count(filters: Q):
+        calls.append(filters)
+        return len(calls)
+
+    assert 1 == count(Q([TestModel.data == '1']))
+    assert 1 == count(Q([TestModel.data == '1']))
+    assert 2 == count(Q([TestModel.data == '2']))
+    assert 3 == count(Q([TestModel.data == '1'], params=dict(a=1)))
+    assert 3 == count(Q([TestModel.data == '1'], params=dict(a=1)))
+    assert 4 == count(Q([text('data > :data')], params=dict(data='1')))
+    assert 4 == count(Q([text('data > :data')], params=dict(data='1')))
+    assert 5 == count(Q([text('data > :data')], params=dict(data='2')))
+    assert len(calls) == 5
+
+    assert Q([TestModel.data == '1']) == Q([TestModel.data == '1'])
+    assert Q([TestModel.data == '1']) != Q([TestModel.data == '2'])
+    assert Q([TestModel.data == '1']) != Q([TestModel.id == 1])
+    assert Q([0]) != Q([TestModel.id == 1])
@@ -1,10 +1,13 @@
-from contextlib import asynccontextmanager
-from datetime import datetime, timedelta
+import asyncio
+from contextlib import nullcontext
+from datetime import UTC, datetime, timedelta
+from functools import partial
 
 import pytest
 import pytest_asyncio
-from sqlalchemy import DateTime, String, func, text
-from sqlalchemy.orm import Mapped, mapped_column as C
+from sqlalchemy import DateTime, String, event, func, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Mapped, mapped_column as C, with_loader_criteria
 
 from greyhorse_sqla.config import EngineConfig, SqlEngineType
 from greyhorse_sqla.factory import SqlaAsyncEngineFactory
@@ -26,6 +29,13 @@ class TestModel(SqlaModel[int]):
     __mapper_args__ = {'eager_defaults': True}
 
 
+class TestCompositeModel(SqlaModel[tuple[int, str]]):
+    __tablename__ = 'test_model_repo_composite'
+
+    id: Mapped[int] = C(primary_key=True)
+    key: Mapped[str] = C(String(32), primary_key=True)
+
+
 @pytest_asyncio.fixture(
     scope='module',
     params=(
@@ -69,12 +79,7 @@ async def sqla_engine(request):
 @pytest_asyncio.fixture(scope='function')
 async def sqla_session(sqla_engine):
     async with sqla_engine.session(force_rollback=True) as session:
-
-        @asynccontextmanager
-        async def func():
-            yield session
-
-        yield func
+        yield partial(nullcontext, session)
 
     await sqla_engine.teardown_session()
 
@@ -85,8 +90,8 @@ async def test_create(sqla_session):
     instance = await repo.create({'id': 1, 'data': '123'})
     assert instance.id > 0
     assert instance.data == '123'
-    assert datetime.utcnow().replace(microsecond=0) - instance.create_date.replace(microsecond=0) \
-           < timedelta(seconds=2)
+    now = datetime.now(UTC).replace(tzinfo=None)
+    assert now - instance.create_date < timedelta(seconds=2)
 
 
 @pytest.mark.asyncio
@@ -103,6 +108,27 @@ async def test_get_or_create(sqla_session):
     assert obj2.data == '123'
 
 
+@pytest.mark.asyncio
+async def test_create_detached(sqla_session):
+    repo = SqlaModelRepository(TestModel, sqla_session)
+    obj = await repo.create_detached(dict(data='123'))
+
+    assert obj.id is not None
+    assert obj.data == '123'
+    assert obj == await repo.get(obj.id)
+
+
+@pytest.mark.asyncio
+async def test_insert_many(sqla_session):
+    repo = SqlaModelRepository(TestModel, sqla_session)
+
+    assert 0 == await repo.insert_many([])
+    assert 3 == await repo.insert_many([dict(data='1'), dict(data='2'), dict(data='3')])
+
+    objects = await repo.list()
+    assert [obj.data for obj in objects] == ['1', '2', '3']
+
+
 @pytest.mark.asyncio
 async def test_update_by_id(sqla_session):
     repo = SqlaModelRepository(TestModel, sqla_session)
@@ -112,6 +138,20 @@ async def test_update_by_id(sqla_session):
     assert not await repo.update_by_id(-1, dict(data='234'))
 
 
+@pytest.mark.asyncio
+async def test_update_any(sqla_session):
+    repo = SqlaModelRepository(TestModel, sqla_session)
+    obj1 = await repo.create(dict(data='1'))
+    obj2 = await repo.create(dict(data='2'))
+    obj3 = await repo.create(dict(data='3'))
+
+    assert 2 == await repo.update_any([obj1.id, obj3.id, -1], dict(data='0'))
+
+    assert obj1.data == '0'
+    assert obj2.data == '2'
+    assert obj3.data == '0'
+
+
 @pytest.mark.asyncio
 async def test_update_by(sqla_session):
     repo = SqlaModelRepository(TestModel, sqla_session)
@@ -139,6 +179,63 @@ async def test_get(sqla_session):
     assert not await repo.get(-1)
 
 
+@pytest.mark.asyncio
+async def test_get_identity_map(sqla_session):
+    repo = SqlaModelRepository(TestModel, sqla_session)
+    obj1 = await repo.create(dict(data='1'))
+
+    assert obj1 is await repo.get(obj1.id)
+    assert await repo.exists(obj1.id)
+
+    assert await repo.delete_by_id(obj1.id)
+    assert not await repo.get(obj1.id)
+    assert not await repo.exists(obj1.id)
+
+
+@pytest.mark.asyncio
+async def test_get_overridden_queries(sqla_session):
+    class HiddenRepository(SqlaModelRepository):
+        hidden = None
+
+        def query_for_select(self, **kwargs):
+            return super().query_for_select(**kwargs).where(TestModel.data != self.hidden)
+
+        def query_for_delete(self, **kwargs):
+            return super().query_for_delete(**kwargs).where(TestModel.data != self.hidden)
+
+        def query_for_exists(self, **kwargs):
+            return super().query_for_exists(**kwargs).where(TestModel.data != self.hidden)
+
+    repo = HiddenRepository(TestModel, sqla_session)
+    obj1 = await repo.create(dict(data='1'))
+    obj2 = await repo.create(dict(data='2'))
+
+    repo.hidden = '2'
+    assert obj1 == await repo.get(obj1.id)
+    assert not await repo.get(obj2.id)
+    repo.hidden = '1'
+    assert not await repo.get(obj1.id)
+    assert obj2 == await repo.get(obj2.id)
+    assert not await repo.exists(obj1.id)
+    assert await repo.exists(obj2.id)
+
+    assert not await repo.delete_by_id(obj1.id)
+    repo.hidden = '2'
+    assert await repo.delete_by_id(obj1.id)
+
+
+@pytest.mark.asyncio
+async def test_get_with_session(sqla_session):
+    repo = SqlaModelRepository(TestModel, sqla_session)
+    obj1 = await repo.create(dict(data='1'))
+
+    async with sqla_session() as session:
+        assert obj1 == await repo.get(obj1.id, session=session)
+        assert [obj1] == await repo.get_any([obj1.id], session=session)
+        assert 1 == await repo.count(session=session)
+        assert await repo.exists(obj1.id, session=session)
+
+
 @pytest.mark.asyncio
 async def test_get_any(sqla_session):
     repo = SqlaModelRepository(TestModel, sqla_session)
@@ -169,6 +266,107 @@ async def test_get_any(sqla_session):
     assert objects[4] is None
 
 
+@pytest.mark.asyncio
+async def test_get_any_many(sqla_session):
+    repo = SqlaModelRepository(TestModel, sqla_session)
+    repo.ARRAY_PARAM_THRESHOLD = 2
+    obj1 = await repo.create(dict(data='1'))
+    obj2 = await repo.create(dict(data='2'))
+
+    objects = await repo.get_any([obj2.id, -1, obj1.id, obj2.id])
+    assert len(objects) == 4
+    assert objects[0] == obj2
+    assert objects[1] is None
+    assert objects[2] == obj1
+    assert objects[3] == obj2
+
+
+def test_query_any_array():
+    dialect = postgresql.dialect()
+    repo = SqlaModelRepository(TestModel, None)
+
+    # Statements for any number of ids share the cache key, ids are passed as a parameter
+    key = repo.query_any_array([1, 2, 2, 3])._generate_cache_key()
+    assert key.key == repo.query_any_array([4])._generate_cache_key().key
+
+    compiled = repo.query_any_array([1, 2, 2, 3]).compile(dialect=dialect)
+    assert '= ANY (%(ids)s::INTEGER[])' in str(compiled)
+    assert compiled.params['ids'] == [1, 2, 3]
+
+    repo = SqlaModelRepository(TestCompositeModel, None)
+    key = repo.query_any_array([(1, 'a'), (2, 'b')])._generate_cache_key()
+    assert key.key == repo.query_any_array([(3, 'c')])._generate_cache_key().key
+
+    compiled = repo.query_any_array([(1, 'a'), (2, 'b')]).compile(dialect=dialect)
+    assert 'unnest(%(ids_0)s::INTEGER[], %(ids_1)s::VARCHAR(32)[])' in str(compiled)
+    assert compiled.params == dict(ids_0=[1, 2], ids_1=['a', 'b'])
+
+
+@pytest.mark.asyncio
+async def test_get_batched(sqla_session):
+    repo = SqlaModelRepository(TestModel, sqla_session)
+    obj1 = await repo.create(dict(data='1'))
+    obj2 = await repo.create(dict(data='2'))
+
+    calls = []
+    get_any = repo.get_any
+
+    async def counted_get_any(indices, **kwargs):
+        calls.append(indices)
+        return await get_any(indices, **kwargs)
+
+    repo.get_any = counted_get_any
+
+    objects = await asyncio.gather(
+        repo.get_batched(obj1.id), repo.get_batched(-1),
+        repo.get_batched(obj2.id), repo.get_batched(obj1.id),
+    )
+    assert objects == [obj1, None, obj2, obj1]
+    assert calls == [[obj1.id, -1, obj2.id]]
+
+    assert obj2 == await repo.get_batched(obj2.id)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_batched_cancel_caller(sqla_session):
+    repo = SqlaModelRepository(TestModel, sqla_session)
+    obj1 = await repo.create(dict(data='1'))
+    obj2 = await repo.create(dict(data='2'))
+
+    first = asyncio.create_task(repo.get_batched(obj1.id))
+    second = asyncio.create_task(repo.get_batched(obj2.id))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert obj2 == await second
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+@pytest.mark.asyncio
+async def test_get_batched_sessions(sqla_engine):
+    repo = SqlaModelRepository(TestModel, sqla_engine.session)
+    async with sqla_engine.session():
+        obj_id = (await repo.create(dict(data='1'))).id
+    await sqla_engine.teardown_session()
+
+    async def get_in_session():
+        async with sqla_engine.session(force_rollback=True):
+            obj = await repo.get_batched(obj_id)
+            assert obj.id == obj_id
+            assert obj is await repo.get(obj_id)
+        await sqla_engine.teardown_session()
+        return obj
+
+    objects = await asyncio.gather(get_in_session(), get_in_session())
+    assert objects[0] is not objects[1]
+
+    async with sqla_engine.session():
+        assert await repo.delete_by_id(obj_id)
+    await sqla_engine.teardown_session()
+
+
 @pytest.mark.asyncio
 async def test_list(sqla_session):
     repo = SqlaModelRepository(TestModel, sqla_session)
@@ -226,6 +424,20 @@ async def test_list(sqla_session):
     assert objects[0] == obj3
 
 
+@pytest.mark.asyncio
+async def test_iter_list(sqla_session):
+    repo = SqlaModelRepository(TestModel, sqla_session)
+    obj1 = await repo.create(dict(data='1'))
+    obj2 = await repo.create(dict(data='2'))
+    obj3 = await repo.create(dict(data='3'))
+
+    objects = [obj async for obj in repo.iter_list(chunk_size=2)]
+    assert objects == [obj1, obj2, obj3]
+
+    objects = [obj async for obj in repo.iter_list(Q([TestModel.data != '2']), skip=1)]
+    assert objects == [obj3]
+
+
 @pytest.mark.asyncio
 async def test_list_filters(sqla_session):
     repo = SqlaModelRepository(TestModel, sqla_session)
@@ -315,6 +527,9 @@ async def test_exists(sqla_session):
     res = await repo.exists(-1)
     assert res is False
 
+    res = await repo.exists(obj1.id, execution_options=dict(populate_existing=True))
+    assert res is True
+
     res = await repo.exists_by(Q([]))
     assert res is True
 
@@ -340,6 +555,26 @@ async def test_exists(sqla_session):
     assert res is False
 
 
+@pytest.mark.asyncio
+async def test_count_exists_loader_criteria(sqla_session):
+    repo = SqlaModelRepository(TestModel, sqla_session)
+    await repo.create(dict(data='1'))
+    obj2 = await repo.create(dict(data='2'))
+
+    def hide_second(state):
+        state.statement = state.statement.options(
+            with_loader_criteria(TestModel, TestModel.data != '2'),
+        )
+
+    async with sqla_session() as session:
+        event.listen(session.sync_session, 'do_orm_execute', hide_second)
+        try:
+            assert 1 == await repo.count(Q([TestModel.id > 0]))
+            assert not await repo.exists_by(Q([TestModel.id == obj2.id]))
+        finally:
+            event.remove(session.sync_session, 'do_orm_execute', hide_second)
+
+
 @pytest.mark.asyncio
 async def test_load(sqla_session):
     repo = SqlaModelRepository(TestModel, sqla_session)
@@ -429,6 +664,16 @@ async def test_save_all(sqla_session):
     assert objects[2].data == obj3.data
 
 
+@pytest.mark.asyncio
+async def test_save_all_batches(sqla_session):
+    repo = SqlaModelRepository(TestModel, sqla_session)
+    objects = [TestModel(data=str(i)) for i in range(5)]
+
+    assert await repo.save_all(objects, batch_size=2)
+    assert all(obj.id is not None for obj in objects)
+    assert 5 == await repo.count()
+
+
 @pytest.mark.asyncio
 async def test_delete(sqla_session):
     repo = SqlaModelRepository(TestModel, sqla_session)